@@ -4,7 +4,7 @@ from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import app.config as config
-from app.db import SessionDep
+from app.db import SessionDep, ReadSessionDep
 from app.exceptions import TokenExpiredException, NoJwtException, NoUserIdException, TokenNoFound
 from app.crud.crud import UserCRUD
 
@@ -16,7 +16,7 @@ def get_token(request: Request):
     return token
 
 
-async def get_current_user(token: str = Depends(get_token), session: AsyncSession = SessionDep):
+async def load_current_user(token: str, session: AsyncSession):
     try:
         payload = jwt.decode(token, config.SECRET_KEY, algorithms=config.ALGORITHM)
     except JWTError:
@@ -34,4 +34,16 @@ async def get_current_user(token: str = Depends(get_token), session: AsyncSessio
     user = await UserCRUD.find_one_or_none_by_id(data_id=int(user_id), session=session)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User not found')
-    return user
\ No newline at end of file
+    return user
+
+
+async def get_current_user(token: str = Depends(get_token), session: AsyncSession = SessionDep):
+    return await load_current_user(token, session)
+
+
+async def get_current_user_read(token: str = Depends(get_token), session: AsyncSession = ReadSessionDep):
+    """
+    Пользователь для GET-страниц: проверка идет в той же сессии только для чтения, что и запросы страницы,
+    без транзакции в основной БД и второго соединения из пула
+    """
+    return await load_current_user(token, session)
@@ -4,7 +4,7 @@ from app.db import SessionDep
 from app.exceptions import UserAlreadyExistsException, IncorrectEmailOrPasswordException
 from app.auth.auth import authenticate_user, create_access_token
 from app.crud.crud import UserCRUD
-from app.auth.schemas import SUserRegister, SUserAuth, EmailModel, SUserAddDB
+from app.auth.schemas import SUserRegister, SUserAuth, SUserAddDB
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix='/auth', tags=['Auth'])
@@ -12,12 +12,13 @@ router = APIRouter(prefix='/auth', tags=['Auth'])
 
 @router.post("/register/")
 async def register_user(user_data: SUserRegister, session: AsyncSession = SessionDep) -> dict:
-    user = await UserCRUD.find_one_or_none(session=session, filters=EmailModel(email=user_data.email))
-    if user:
-        raise UserAlreadyExistsException
     user_data_dict = user_data.model_dump()
     del user_data_dict['confirm_password']
-    await UserCRUD.add(session=session, values=SUserAddDB(**user_data_dict))
+    # ON CONFLICT DO NOTHING: почта или телефон уже заняты - запись не добавляется
+    user = await UserCRUD.upsert(session=session, values=SUserAddDB(**user_data_dict), conflict_keys=None,
+                                 update_fields=[])
+    if user is None:
+        raise UserAlreadyExistsException
     return {'message': f'Вы успешно зарегистрированы!'}
 
 
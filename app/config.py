@@ -8,6 +8,40 @@ DB_PORT = os.environ.get('DB_PORT')
 DB_NAME = os.environ.get('DB_NAME')
 DB_USER = os.environ.get('DB_USER')
 DB_PASS = os.environ.get('DB_PASS')
+# Реплики для чтения через запятую: host1:port1,host2:port2
+DB_REPLICAS = [replica.strip() for replica in os.environ.get('DB_REPLICAS', '').split(',') if replica.strip()]
+# Сколько секунд не направлять запросы на недоступную реплику
+DB_REPLICA_RETRY = float(os.environ.get('DB_REPLICA_RETRY', 30))
+
+# Пул соединений и кэш подготовленных выражений asyncpg
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', -1))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'false').lower() in ('1', 'true', 'yes')
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 100))
+
+# Порог медленного запроса, мс (0 - не логировать)
+DB_SLOW_QUERY_MS = int(os.environ.get('DB_SLOW_QUERY_MS', 500))
+# Предельное число SQL-запросов на запрос или задачу планировщика (0 - без проверки, для тестов)
+DB_QUERY_BUDGET = int(os.environ.get('DB_QUERY_BUDGET', 0))
+
+# Кэш справочников (блюда, классы): время жизни, с (0 - выключен) и число записей
+REF_CACHE_TTL = float(os.environ.get('REF_CACHE_TTL', 300))
+REF_CACHE_SIZE = int(os.environ.get('REF_CACHE_SIZE', 1024))
+# Сброс кэшей на всех воркерах через LISTEN/NOTIFY PostgreSQL
+REF_CACHE_NOTIFY = os.environ.get('REF_CACHE_NOTIFY', 'true').lower() in ('1', 'true', 'yes')
+
+# Сколько секунд отдавать готовую общую страницу, обновляя ее в фоне (0 - только объединение запросов)
+COALESCE_STALE_SECONDS = float(os.environ.get('COALESCE_STALE_SECONDS', 0))
+
+# Формирование xlsx: число одновременных задач и пул процессов вместо потоков
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+EXPORT_MAX_DAYS = int(os.environ.get('EXPORT_MAX_DAYS', 62))
+EXPORT_USE_PROCESSES = os.environ.get('EXPORT_USE_PROCESSES', 'false').lower() in ('1', 'true', 'yes')
+# Кэш готовых xlsx: число файлов и на сколько дней вперед они формируются заранее (0 - не формировать)
+EXPORT_CACHE_SIZE = int(os.environ.get('EXPORT_CACHE_SIZE', 32))
+EXPORT_PREGENERATE_DAYS = int(os.environ.get('EXPORT_PREGENERATE_DAYS', 7))
 
 SECRET_KEY = os.environ.get('SECRET_KEY')
 ALGORITHM = os.environ.get('ALGORITHM')
@@ -19,10 +53,18 @@ PASSWORD_MAIL = os.environ.get('PASSWORD_MAIL')
 TO_MAIL = os.environ.get('TO_MAIL')
 SCHOOL = os.environ.get('SCHOOL')
 
-def get_link_db(driver: str) -> str:
+# Помечать транзакции страниц только для чтения как READ ONLY (иначе - autocommit без BEGIN/COMMIT)
+DB_READ_ONLY = os.environ.get('DB_READ_ONLY', 'false').lower() in ('1', 'true', 'yes')
+
+# Интервал пакетной записи данных классов, мс (0 - запись сразу в запросе)
+SEND_DATA_BATCH_MS = int(os.environ.get('SEND_DATA_BATCH_MS', 0))
+
+def get_link_db(driver: str, host: str | None = None, port: str | None = None) -> str:
     """
     using your DB
     :param driver: postgresql+asyncpg, sqlite+aiosqlite, mysql
+    :param host: хост БД, по умолчанию DB_HOST
+    :param port: порт БД, по умолчанию DB_PORT
     :return:
     """
-    return f'{driver}://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    return f'{driver}://{DB_USER}:{DB_PASS}@{host or DB_HOST}:{port or DB_PORT}/{DB_NAME}'
@@ -1,12 +1,78 @@
 from loguru import logger
 from pydantic import BaseModel
-from sqlalchemy import select, update, delete
+from typing import Any, Awaitable, Callable, Hashable
+
+from sqlalchemy import select, update, delete, insert, event, func
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import app.config as config
+from app.crud.cache import RefCache, MISSING
+from app.db import is_replica_session, session_manager
+
+# Канал PostgreSQL для уведомлений о сбросе кэшей справочников
+CACHE_CHANNEL = 'ref_cache_invalidation'
+
+
+@event.listens_for(Session, 'before_commit')
+def _notify_invalidation(session: Session) -> None:
+    # NOTIFY доставляется остальным воркерам только после коммита транзакции
+    cruds = session.info.get('invalidate_caches')
+    if not cruds or not config.REF_CACHE_NOTIFY or session.get_bind().dialect.name != 'postgresql':
+        return
+    for crud in cruds:
+        session.execute(select(func.pg_notify(CACHE_CHANNEL, crud.model.__tablename__)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session: Session) -> None:
+    # Повторная очистка после коммита: пока шла транзакция, кэш мог заполниться старыми данными
+    for crud in session.info.pop('invalidate_caches', ()):
+        crud.cache.clear()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_after_rollback(session: Session) -> None:
+    # Кэш сброшен еще при записи, а сессия с незакоммиченной записью его не заполняет (см. cached)
+    session.info.pop('invalidate_caches', None)
 
 
 class BaseCRUD:
     model = None
+    # Кэш справочных данных, задается в наследниках для небольших редко изменяемых таблиц.
+    # Хранит только неизменяемые значения (модели чтения), объекты ORM привязаны к своей сессии
+    cache: RefCache | None = None
+
+    @classmethod
+    async def cached(cls, session: AsyncSession, key: Hashable, loader: Callable[[AsyncSession], Awaitable[Any]]):
+        # Вернуть значение из кэша или загрузить его из БД через loader(session).
+        # Промах в сессии реплики загружается из основной БД: отстающая реплика вернула бы в кэш данные
+        # до записи, и они продержались бы до конца TTL, ведь сброс после коммита уже прошел.
+        # Загруженное значение не кэшируется, если кэш сбросили, пока шел запрос (сравнивается generation),
+        # или в этой сессии есть незакоммиченная запись в таблицу
+        if cls.cache is None:
+            return await loader(session)
+        value = cls.cache.get(key)
+        if value is MISSING:
+            generation = cls.cache.generation
+            if is_replica_session(session):
+                async with session_manager.read_session_maker() as primary_session:
+                    value = await loader(primary_session)
+            else:
+                value = await loader(session)
+            if generation == cls.cache.generation and cls not in session.info.get('invalidate_caches', ()):
+                cls.cache.set(key, value)
+        return value
+
+    @classmethod
+    def invalidate_cache(cls, session: AsyncSession):
+        # Очистить кэш сейчас и еще раз после коммита сессии
+        if cls.cache is None:
+            return
+        cls.cache.clear()
+        session.info.setdefault('invalidate_caches', set()).add(cls)
 
     @classmethod
     async def add(cls, session: AsyncSession, values: BaseModel):
@@ -15,6 +81,7 @@ class BaseCRUD:
         logger.info(f"Добавление записи {cls.model.__name__} с параметрами: {values_dict}")
         new_instance = cls.model(**values_dict)
         session.add(new_instance)
+        cls.invalidate_cache(session)
         try:
             await session.flush()
             logger.info(f"Запись {cls.model.__name__} успешно добавлена.")
@@ -24,12 +91,65 @@ class BaseCRUD:
             raise e
         return new_instance
 
+    @classmethod
+    async def add_many(cls, session: AsyncSession, values: list[BaseModel], returning: bool = False):
+        # Добавить несколько записей одним запросом INSERT ... VALUES (...), (...)
+        values_list = [item.model_dump(exclude_unset=True) for item in values]
+        if not values_list:
+            return [] if returning else 0
+        logger.info(f"Добавление {len(values_list)} записей {cls.model.__name__}")
+        query = insert(cls.model).values(values_list)
+        cls.invalidate_cache(session)
+        try:
+            if returning:
+                result = await session.scalars(query.returning(cls.model))
+                records = result.all()
+                logger.info(f"Добавлено {len(records)} записей {cls.model.__name__}.")
+                return records
+            result = await session.execute(query)
+            logger.info(f"Добавлено {result.rowcount} записей {cls.model.__name__}.")
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка при добавлении записей: {e}")
+            raise e
+
+    @classmethod
+    async def upsert(cls, session: AsyncSession, values: BaseModel, conflict_keys: list[str] | None,
+                     update_fields: list[str] | None = None):
+        # Добавить запись или обновить существующую одним запросом INSERT ... ON CONFLICT ... RETURNING.
+        # update_fields по умолчанию - все поля, кроме conflict_keys; пустой список - ON CONFLICT DO NOTHING
+        # (conflict_keys=None - по любому уникальному ограничению), тогда для существующей записи вернется None
+        values_dict = values.model_dump(exclude_unset=True)
+        if update_fields is None:
+            update_fields = [key for key in values_dict if key not in (conflict_keys or [])]
+        logger.info(f"Добавление или обновление записи {cls.model.__name__} по {conflict_keys}: {values_dict}")
+        query = postgresql.insert(cls.model).values(**values_dict)
+        if update_fields:
+            # onupdate для ON CONFLICT не срабатывает, поэтому updated_at задается явно
+            query = query.on_conflict_do_update(
+                index_elements=conflict_keys,
+                set_={**{field: query.excluded[field] for field in update_fields}, 'updated_at': func.now()},
+            )
+        else:
+            query = query.on_conflict_do_nothing(index_elements=conflict_keys)
+        query = query.returning(cls.model).execution_options(populate_existing=True)
+        cls.invalidate_cache(session)
+        try:
+            result = await session.scalars(query)
+            record = result.one_or_none()
+            logger.info(f"Запись {cls.model.__name__} {'сохранена' if record else 'уже существует'}.")
+            return record
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка при добавлении или обновлении записи: {e}")
+            raise e
+
     @classmethod
     async def get_all(cls, session: AsyncSession):
         query = select(cls.model)
         result = await session.execute(query)
-        records = result.scalars().all()
-        return records
+        return result.scalars().all()
 
     @classmethod
     async def delete(cls, session: AsyncSession, filters: BaseModel):
@@ -41,6 +161,7 @@ class BaseCRUD:
             raise ValueError("Нужен хотя бы один фильтр для удаления.")
 
         query = delete(cls.model).filter_by(**filter_dict)
+        cls.invalidate_cache(session)
         try:
             result = await session.execute(query)
             await session.flush()
@@ -52,8 +173,28 @@ class BaseCRUD:
             raise e
 
     @classmethod
-    async def update(cls, session: AsyncSession, filters: BaseModel, values: BaseModel):
-        # Обновить записи по фильтрам
+    async def update_many(cls, session: AsyncSession, values: list[dict]):
+        # Обновить несколько записей по первичному ключу одним запросом (executemany)
+        if not values:
+            return 0
+        logger.info(f"Обновление {len(values)} записей {cls.model.__name__} по первичному ключу")
+        cls.invalidate_cache(session)
+        try:
+            await session.execute(update(cls.model), values)
+            logger.info(f"Обновлено {len(values)} записей.")
+            return len(values)
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка при обновлении записей: {e}")
+            raise e
+
+    @classmethod
+    async def update(cls, session: AsyncSession, filters: BaseModel, values: BaseModel, returning: bool = False,
+                     synchronize_session: str | bool = False):
+        # Обновить записи по фильтрам одним запросом UPDATE.
+        # По умолчанию возвращается число строк без синхронизации объектов сессии,
+        # returning=True - измененные записи через UPDATE ... RETURNING.
+        # synchronize_session="fetch" нужен, только если вызывающий код дальше работает с объектами сессии
         filter_dict = filters.model_dump(exclude_unset=True)
         values_dict = values.model_dump(exclude_unset=True)
         logger.info(f"Обновление записей {cls.model.__name__} по фильтру: {filter_dict} с параметрами: {values_dict}")
@@ -61,11 +202,19 @@ class BaseCRUD:
             update(cls.model)
             .where(*[getattr(cls.model, k) == v for k, v in filter_dict.items()])
             .values(**values_dict)
-            .execution_options(synchronize_session="fetch")
         )
+        if returning:
+            query = query.returning(cls.model).execution_options(populate_existing=True)
+        else:
+            query = query.execution_options(synchronize_session=synchronize_session)
+        cls.invalidate_cache(session)
         try:
+            if returning:
+                result = await session.scalars(query)
+                records = result.all()
+                logger.info(f"Обновлено {len(records)} записей.")
+                return records
             result = await session.execute(query)
-            await session.flush()
             logger.info(f"Обновлено {result.rowcount} записей.")
             return result.rowcount
         except SQLAlchemyError as e:
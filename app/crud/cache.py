@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import app.config as config
+
+MISSING = object()
+
+# Все созданные кэши справочников
+ref_caches: list['RefCache'] = []
+
+
+class RefCache:
+    """
+    Кэш справочных данных в памяти процесса с ограничением по времени жизни
+    и количеству записей (вытесняются давно не использованные).
+    generation увеличивается при каждой очистке: по нему загрузка, начатая до сброса,
+    узнает, что ее результат может быть старше записи.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def create_ref_cache() -> RefCache | None:
+    """Кэш справочника по настройкам REF_CACHE_TTL и REF_CACHE_SIZE, None если кэш выключен"""
+    if config.REF_CACHE_TTL <= 0:
+        return None
+    cache = RefCache(ttl=config.REF_CACHE_TTL, max_size=config.REF_CACHE_SIZE)
+    ref_caches.append(cache)
+    return cache
+
+
+def clear_ref_caches() -> None:
+    for cache in ref_caches:
+        cache.clear()
@@ -2,11 +2,15 @@ from datetime import timedelta, date
 
 from loguru import logger
 from pydantic import BaseModel
-from sqlalchemy import select, and_, desc
+from sqlalchemy import select, and_, or_, desc, update, func, cast, DateTime
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
 from app.crud.base import BaseCRUD
+from app.crud.cache import create_ref_cache
+from app.crud.read_models import ClassRow, DataSendRow, DishRow, MenuDishRow, CLASS_ROW_COLUMNS, \
+    DATASEND_ROW_COLUMNS, DISH_ROW_COLUMNS, MENU_DISH_ROW_COLUMNS
 from app.auth.models import User
 from app.models.models import Dish, Menu, Class, DataSend
 
@@ -68,79 +72,229 @@ class UserCRUD(BaseCRUD):
 
 class DishCRUD(BaseCRUD):
     model = Dish
+    cache = create_ref_cache()
 
     @classmethod
-    async def get_dish_by_id(cls, session: AsyncSession, dish_id: int) -> Dish:
-        query = select(cls.model).filter_by(id=dish_id)
-        result = await session.execute(query)
-        return result.scalar_one_or_none()
+    async def get_dish_by_id(cls, session: AsyncSession, dish_id: int) -> DishRow | None:
+        # Блюдо по id из кэша справочника, без объекта ORM
+        async def load(session: AsyncSession):
+            result = await session.execute(select(*DISH_ROW_COLUMNS).filter(cls.model.id == dish_id))
+            row = result.one_or_none()
+            return DishRow._make(row) if row else None
+
+        return await cls.cached(session, ('id', dish_id), load)
 
     @classmethod
-    async def get_dish_by_name(cls, session: AsyncSession, dish_name: str) -> Dish:
-        query = select(cls.model).filter_by(title=dish_name)
-        result = await session.execute(query)
-        return result.scalar_one_or_none()
+    async def get_dish_by_name(cls, session: AsyncSession, dish_name: str) -> DishRow | None:
+        # Блюдо по названию из кэша справочника, без объекта ORM
+        async def load(session: AsyncSession):
+            result = await session.execute(select(*DISH_ROW_COLUMNS).filter(cls.model.title == dish_name))
+            row = result.one_or_none()
+            return DishRow._make(row) if row else None
+
+        return await cls.cached(session, ('title', dish_name), load)
+
+    @classmethod
+    async def get_dish_rows(cls, session: AsyncSession) -> list[DishRow]:
+        # Все блюда для отображения, без объектов ORM
+        async def load(session: AsyncSession):
+            result = await session.execute(select(*DISH_ROW_COLUMNS))
+            return list(map(DishRow._make, result))
+
+        return await cls.cached(session, 'rows', load)
 
 
 class MenuCRUD(BaseCRUD):
     model = Menu
 
     @classmethod
-    async def get_all(cls, session: AsyncSession):
-        current_date = date.today()
-        left_date = current_date - timedelta(days=1)
-        right_date = current_date + timedelta(days=3)
-        query = select(cls.model).filter(and_(cls.model.date_menu >= left_date, cls.model.date_menu <= right_date))
+    async def get_menu_dates(cls, session: AsyncSession, date_from: date, date_to: date) -> list[date]:
+        # Даты, на которые есть меню, по индексу ix_menus_date_menu_category_menu без чтения строк меню
+        query = (
+            select(cls.model.date_menu)
+            .distinct()
+            .filter(and_(cls.model.date_menu >= date_from, cls.model.date_menu <= date_to))
+            .order_by(cls.model.date_menu)
+        )
         result = await session.execute(query)
-        return result.scalars().all()
+        return list(result.scalars().all())
 
     @classmethod
-    async def get_all_menus_by_one_day(cls, session: AsyncSession, day: date):
-        query = select(cls.model).filter(cls.model.date_menu == day)
+    async def get_version(cls, session: AsyncSession, date_from: date, date_to: date):
+        # Версия меню за период: количество строк и время последнего изменения меню или блюд.
+        # updated_at хранится без часового пояса (now() в поясе сессии БД), поэтому время
+        # приводится к timestamptz в БД и приходит с часовым поясом
+        query = (
+            select(
+                func.count(cls.model.id).label('count'),
+                cast(func.max(func.greatest(cls.model.updated_at, Dish.updated_at)),
+                     DateTime(timezone=True)).label('last_modified'),
+            )
+            .join(Dish, cls.model.dish_id == Dish.id)
+            .filter(and_(cls.model.date_menu >= date_from, cls.model.date_menu <= date_to))
+        )
         result = await session.execute(query)
-        return result.scalars().all()
+        return result.one()
 
     @classmethod
-    async def get_category_menus_one_day(cls, session: AsyncSession, day: date):
-        query = select(cls.model).filter(and_(cls.model.category_menu == '1-4 классы', cls.model.date_menu == day))
+    async def get_category_menus_with_dish_one_day(cls, session: AsyncSession, day: date):
+        query = (
+            select(cls.model)
+            .options(joinedload(cls.model.dish))
+            .filter(and_(cls.model.category_menu == '1-4 классы', cls.model.date_menu == day))
+            .order_by(cls.model.id)
+        )
         result = await session.execute(query)
         return result.scalars().all()
 
     @classmethod
-    async def get_all_menus_by_five_day(cls, session: AsyncSession):
-        current_date = date.today()
-        left_date = current_date - timedelta(days=3)
-        right_date = current_date + timedelta(days=5)
-        query = select(cls.model).filter(and_(cls.model.date_menu >= left_date, cls.model.date_menu <= right_date))
+    async def get_category_menus_with_dish_by_range(cls, session: AsyncSession, date_from: date, date_to: date):
+        query = (
+            select(cls.model)
+            .options(joinedload(cls.model.dish))
+            .filter(and_(cls.model.category_menu == '1-4 классы',
+                         cls.model.date_menu >= date_from, cls.model.date_menu <= date_to))
+            .order_by(cls.model.date_menu, cls.model.id)
+        )
         result = await session.execute(query)
         return result.scalars().all()
 
+    @staticmethod
+    def get_five_day_range() -> tuple[date, date]:
+        # Период меню панели технолога: 3 дня назад и 5 дней вперед
+        current_date = date.today()
+        return current_date - timedelta(days=3), current_date + timedelta(days=5)
+
+    @classmethod
+    async def get_menu_rows_by_range(cls, session: AsyncSession, date_from: date, date_to: date) -> list[MenuDishRow]:
+        # Меню с блюдами за период для отображения: только нужные колонки, без объектов ORM
+        query = (
+            select(*MENU_DISH_ROW_COLUMNS)
+            .join(Dish, cls.model.dish_id == Dish.id)
+            .filter(and_(cls.model.date_menu >= date_from, cls.model.date_menu <= date_to))
+            .order_by(cls.model.id)
+        )
+        result = await session.execute(query)
+        return list(map(MenuDishRow._make, result))
+
+    @classmethod
+    async def get_nutrition_totals(cls, session: AsyncSession, date_from: date, date_to: date):
+        # Итоги пищевой ценности меню по дням, категориям и приемам пищи одним запросом GROUP BY
+        query = (
+            select(
+                cls.model.date_menu,
+                cls.model.category_menu,
+                cls.model.type_menu,
+                func.count(cls.model.id).label('count_dishes'),
+                func.coalesce(func.sum(Dish.calories), 0).label('calories'),
+                func.coalesce(func.sum(Dish.protein), 0).label('protein'),
+                func.coalesce(func.sum(Dish.fats), 0).label('fats'),
+                func.coalesce(func.sum(Dish.carb), 0).label('carb'),
+                func.coalesce(func.sum(Dish.out_gramm), 0).label('out_gramm'),
+                func.coalesce(func.sum(Dish.price), 0).label('price'),
+            )
+            .join(Dish, cls.model.dish_id == Dish.id)
+            .filter(and_(cls.model.date_menu >= date_from, cls.model.date_menu <= date_to))
+            .group_by(cls.model.date_menu, cls.model.category_menu, cls.model.type_menu)
+            .order_by(cls.model.date_menu, cls.model.category_menu, cls.model.type_menu)
+        )
+        result = await session.execute(query)
+        return result.all()
+
 
 class ClassCRUD(BaseCRUD):
     model = Class
+    cache = create_ref_cache()
+
+    @classmethod
+    async def get_class_by_one(cls, session: AsyncSession, name_class: str) -> ClassRow | None:
+        # Класс по имени из кэша справочника, без объекта ORM
+        async def load(session: AsyncSession):
+            result = await session.execute(select(*CLASS_ROW_COLUMNS).filter(cls.model.name_class == name_class))
+            row = result.one_or_none()
+            return ClassRow._make(row) if row else None
+
+        return await cls.cached(session, ('name_class', name_class), load)
+
+    @classmethod
+    async def get_class_rows(cls, session: AsyncSession) -> list[ClassRow]:
+        # Все классы для отображения, без объектов ORM
+        async def load(session: AsyncSession):
+            result = await session.execute(select(*CLASS_ROW_COLUMNS).order_by(cls.model.name_class))
+            return list(map(ClassRow._make, result))
+
+        return await cls.cached(session, 'rows', load)
 
     @classmethod
-    async def get_class_by_one(cls, session: AsyncSession, name_class: str) -> Class:
-        query = select(cls.model).filter(cls.model.name_class == name_class)
+    async def get_classes_by_names(cls, session: AsyncSession, names: list[str]):
+        query = select(cls.model).filter(cls.model.name_class.in_(names))
         result = await session.execute(query)
-        return result.scalar_one_or_none()
+        return result.scalars().all()
 
     @classmethod
-    async def get_all(cls, session: AsyncSession):
-        query = select(cls.model).order_by('name_class')
+    async def get_school_totals(cls, session: AsyncSession, day: date):
+        # Итоги по школе одним запросом SELECT sum(...) FILTER (...)
+        closed = cls.model.closed.is_(True)
+        closed_on_day = and_(closed, or_(cls.model.date_closed <= day, cls.model.date_closed.is_(None)))
+        query = select(
+            func.count().label('count_classes'),
+            func.coalesce(func.sum(cls.model.count_class), 0).label('count_all'),
+            func.coalesce(func.sum(cls.model.count_ill), 0).label('count_all_ill'),
+            func.count().filter(closed).label('count_closed'),
+            func.min(cls.model.date_open).filter(closed).label('date_open'),
+            func.count().filter(closed_on_day).label('count_class_closed'),
+            func.coalesce(func.sum(cls.model.count_ill).filter(closed_on_day), 0).label('count_ill_closed'),
+            func.coalesce(func.sum(cls.model.count_class).filter(closed_on_day), 0).label('count_all_closed'),
+        )
         result = await session.execute(query)
-        records = result.scalars().all()
-        return records
+        return result.one()
+
+    @classmethod
+    async def update_all(cls, session: AsyncSession, values: BaseModel):
+        # Обновить все классы одним запросом UPDATE
+        values_dict = values.model_dump(exclude_unset=True)
+        logger.info(f"Обновление всех записей {cls.model.__name__} с параметрами: {values_dict}")
+        query = update(cls.model).values(**values_dict).execution_options(synchronize_session=False)
+        cls.invalidate_cache(session)
+        try:
+            result = await session.execute(query)
+            logger.info(f"Обновлено {result.rowcount} записей.")
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка при обновлении записей: {e}")
+            raise e
+
+    @classmethod
+    async def open_classes_by_date(cls, session: AsyncSession, day: date):
+        # Открыть классы, у которых карантин заканчивается в указанный день
+        logger.info(f"Открытие классов {cls.model.__name__} с датой открытия: {day}")
+        query = (
+            update(cls.model)
+            .where(cls.model.date_open == day)
+            .values(closed=False, date_closed=None, date_open=None)
+            .execution_options(synchronize_session=False)
+        )
+        cls.invalidate_cache(session)
+        try:
+            result = await session.execute(query)
+            logger.info(f"Открыто {result.rowcount} классов.")
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка при открытии классов: {e}")
+            raise e
 
 
 class DataSendCRUD(BaseCRUD):
     model = DataSend
 
     @classmethod
-    async def get_sends_status_by_from_date(cls, session: AsyncSession, day: date):
-        query = select(cls.model).filter(cls.model.date_send == day)
+    async def get_sending_status(cls, session: AsyncSession, day: date) -> bool | None:
+        # Признак отправки данных за день, None если данных за день нет
+        query = select(cls.model.sending).filter(cls.model.date_send == day)
         result = await session.execute(query)
-        return result.scalars().first()
+        return result.scalar_one_or_none()
 
     @classmethod
     async def get_datasend_by_one_day(cls, session: AsyncSession, day: date) -> DataSend:
@@ -149,8 +303,8 @@ class DataSendCRUD(BaseCRUD):
         return result.scalar_one_or_none()
 
     @classmethod
-    async def get_last_by_30(cls, session: AsyncSession):
-        query = select(cls.model).order_by(desc('created_at')).limit(30)
+    async def get_last_rows_by_30(cls, session: AsyncSession) -> list[DataSendRow]:
+        # Последние 30 дней данных для графика, без объектов ORM
+        query = select(*DATASEND_ROW_COLUMNS).order_by(desc(cls.model.created_at)).limit(30)
         result = await session.execute(query)
-        records = result.scalars().all()
-        return records
\ No newline at end of file
+        return list(map(DataSendRow._make, result))
@@ -0,0 +1,136 @@
+"""
+Проверка планов запросов CRUD: python -m app.crud.explain
+
+Наполняет БД тестовыми данными в транзакции, выполняет запросы CRUD и смотрит их EXPLAIN.
+Последовательное сканирование запрещено (enable_seqscan = off), поэтому Seq Scan в плане
+означает, что для запроса нет подходящего индекса. Транзакция всегда откатывается.
+"""
+import asyncio
+import json
+import sys
+from datetime import date, timedelta
+
+from loguru import logger
+from sqlalchemy import event, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.crud import ClassCRUD, DataSendCRUD, DishCRUD, MenuCRUD
+from app.db import engine
+from app.models.models import DataSend, Dish, Menu
+
+SEED_DISHES = 2000
+SEED_DAYS = 400
+CATEGORIES = ['1-4 классы', '5-11 классы', 'ОВЗ']
+MEALS = ['Завтрак', 'Обед']
+
+# Запросы, которые должны идти по индексам
+CHECKS = [
+    ('MenuCRUD.get_menu_dates',
+     lambda session, day: MenuCRUD.get_menu_dates(session=session, date_from=day, date_to=day + timedelta(days=30))),
+    ('MenuCRUD.get_version',
+     lambda session, day: MenuCRUD.get_version(session=session, date_from=day, date_to=day + timedelta(days=3))),
+    ('MenuCRUD.get_category_menus_with_dish_one_day',
+     lambda session, day: MenuCRUD.get_category_menus_with_dish_one_day(session=session, day=day)),
+    ('MenuCRUD.get_category_menus_with_dish_by_range',
+     lambda session, day: MenuCRUD.get_category_menus_with_dish_by_range(session=session, date_from=day,
+                                                                        date_to=day + timedelta(days=7))),
+    ('MenuCRUD.get_nutrition_totals',
+     lambda session, day: MenuCRUD.get_nutrition_totals(session=session, date_from=day,
+                                                        date_to=day + timedelta(days=7))),
+    ('DishCRUD.get_dish_by_name', lambda session, day: DishCRUD.get_dish_by_name(session=session, dish_name='Блюдо 7')),
+    ('ClassCRUD.get_class_by_one', lambda session, day: ClassCRUD.get_class_by_one(session=session, name_class='1А')),
+    ('DataSendCRUD.get_datasend_by_one_day',
+     lambda session, day: DataSendCRUD.get_datasend_by_one_day(session=session, day=day)),
+    ('DataSendCRUD.get_last_rows_by_30', lambda session, day: DataSendCRUD.get_last_rows_by_30(session=session)),
+    ('DataSendCRUD.get_sending_status', lambda session, day: DataSendCRUD.get_sending_status(session=session, day=day)),
+    ('MenuCRUD.get_menu_rows_by_range',
+     lambda session, day: MenuCRUD.get_menu_rows_by_range(session=session, date_from=day - timedelta(days=3),
+                                                          date_to=day + timedelta(days=5))),
+]
+
+
+async def seed(session: AsyncSession, today: date) -> None:
+    dishes = await session.execute(
+        insert(Dish).returning(Dish.id),
+        [{'title': f'Блюдо {i}', 'recipe': i, 'out_gramm': 200, 'price': 10, 'calories': 100, 'protein': 1,
+          'fats': 1, 'carb': 1, 'section': 'гор.блюдо'} for i in range(SEED_DISHES)])
+    dish_ids = dishes.scalars().all()
+    days = [today - timedelta(days=SEED_DAYS // 2) + timedelta(days=i) for i in range(SEED_DAYS)]
+    await session.execute(insert(Menu), [
+        {'date_menu': day, 'category_menu': category, 'type_menu': meal,
+         'dish_id': dish_ids[(i * 7 + j) % len(dish_ids)]}
+        for i, day in enumerate(days) for category in CATEGORIES for meal in MEALS for j in range(5)
+    ])
+    await session.execute(insert(DataSend), [
+        {'date_send': day, 'count_all_ill': 0, 'count_all': 0, 'count_class_closed': 0, 'count_ill_closed': 0,
+         'count_all_closed': 0, 'sending': True} for day in days
+    ])
+    for table in ('dishes', 'menus', 'datasends'):
+        await session.execute(text(f'ANALYZE {table}'))
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    """Таблицы, которые план читает последовательным сканированием"""
+    tables = [plan['Relation Name']] if plan.get('Node Type') == 'Seq Scan' else []
+    for child in plan.get('Plans', []):
+        tables += find_seq_scans(child)
+    return tables
+
+
+async def check_query_plans() -> list[str]:
+    """
+    Выполняет запросы CHECKS на наполненной БД и возвращает описания запросов с Seq Scan
+    :return:
+    """
+    today = date.today()
+    failures = []
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        session = AsyncSession(bind=connection)
+        try:
+            await seed(session, today)
+            await session.execute(text('SET LOCAL enable_seqscan = off'))
+
+            for name, run in CHECKS:
+                statements = []
+
+                def capture(conn, cursor, statement, parameters, context, executemany):
+                    statements.append((statement, parameters))
+
+                event.listen(connection.sync_connection, 'before_cursor_execute', capture)
+                try:
+                    await run(session, today)
+                finally:
+                    event.remove(connection.sync_connection, 'before_cursor_execute', capture)
+
+                for statement, parameters in statements:
+                    result = await connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters)
+                    plan = result.scalar()
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    seq_scans = find_seq_scans(plan[0]['Plan'])
+                    if seq_scans:
+                        failures.append(f"{name}: Seq Scan по {', '.join(seq_scans)}")
+                        logger.error(f"{name}: Seq Scan по {', '.join(seq_scans)}\n{statement}")
+                    else:
+                        logger.info(f"{name}: индексы используются")
+        finally:
+            await session.close()
+            await transaction.rollback()
+    return failures
+
+
+async def main() -> int:
+    try:
+        failures = await check_query_plans()
+    finally:
+        await engine.dispose()
+    if failures:
+        logger.error(f"Запросов с последовательным сканированием: {len(failures)}")
+        return 1
+    logger.info("Все запросы CRUD используют индексы")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
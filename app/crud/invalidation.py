@@ -0,0 +1,65 @@
+import asyncio
+
+import asyncpg
+from loguru import logger
+
+import app.config as config
+from app.crud.base import BaseCRUD, CACHE_CHANNEL
+from app.crud.cache import clear_ref_caches
+import app.crud.crud  # noqa: F401 - регистрирует наследников BaseCRUD с кэшем
+
+_listener: asyncio.Task | None = None
+
+
+def _on_notification(connection, pid: int, channel: str, payload: str) -> None:
+    # payload - имя таблицы, в которой изменились данные. Ключи записей не передаются: запись сбрасывает
+    # кэш таблицы целиком и в своем процессе, ведь UPDATE/DELETE по фильтру не знает, какие ключи он затронул
+    for crud in BaseCRUD.__subclasses__():
+        if crud.cache is not None and crud.model.__tablename__ == payload:
+            crud.cache.clear()
+            logger.debug(f"Кэш {crud.__name__} сброшен по уведомлению процесса {pid}")
+
+
+async def listen_cache_invalidation(check_interval: float = 5) -> None:
+    """
+    Держит отдельное соединение с LISTEN на канале сброса кэшей.
+    Соединение открывается напрямую через asyncpg, а не из пула engine, чтобы не занимать
+    одно из DB_POOL_SIZE соединений для запросов.
+    При обрыве соединения сбрасывает все кэши, т.к. уведомления могли быть пропущены,
+    и переподключается.
+    """
+    while True:
+        try:
+            connection = await asyncpg.connect(config.get_link_db('postgresql'))
+            try:
+                await connection.add_listener(CACHE_CHANNEL, _on_notification)
+                logger.info(f"Подписка на канал {CACHE_CHANNEL} запущена")
+                while not connection.is_closed():
+                    await asyncio.sleep(check_interval)
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка подписки на канал {CACHE_CHANNEL}: {e}")
+        clear_ref_caches()
+        await asyncio.sleep(check_interval)
+
+
+def start_cache_listener() -> None:
+    global _listener
+    if _listener is None:
+        _listener = asyncio.create_task(listen_cache_invalidation())
+
+
+async def stop_cache_listener() -> None:
+    global _listener
+    if _listener is None:
+        return
+    _listener.cancel()
+    try:
+        await _listener
+    except asyncio.CancelledError:
+        pass
+    _listener = None
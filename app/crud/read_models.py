@@ -0,0 +1,79 @@
+from datetime import date
+from typing import NamedTuple
+
+from sqlalchemy import ColumnElement
+
+from app.models.models import Class, DataSend, Dish, Menu
+
+
+# Модели только для чтения: страницы получают кортежи колонок без объектов ORM,
+# карты идентичности и отслеживания изменений атрибутов
+
+
+def compile_columns(read_model: type[NamedTuple], model, **columns: ColumnElement) -> tuple[ColumnElement, ...]:
+    """
+    Колонки запроса в порядке полей модели чтения, собираются один раз при импорте
+    :param read_model: модель чтения
+    :param model: модель ORM, из которой берутся одноименные колонки
+    :param columns: колонки для полей, имя которых не совпадает с колонкой model
+    :return:
+    """
+    return tuple(columns[field].label(field) if field in columns else getattr(model, field)
+                 for field in read_model._fields)
+
+
+class ClassRow(NamedTuple):
+    name_class: str
+    man_class: str
+    count_ill: int
+    count_class: int
+    proc_ill: int | None
+    closed: bool | None
+    date_closed: date | None
+    date_open: date | None
+    date: date | None
+
+
+class DataSendRow(NamedTuple):
+    date_send: date
+    count_all_ill: int
+    count_class_closed: int
+
+
+class DishRow(NamedTuple):
+    id: int
+    title: str
+    recipe: int
+    out_gramm: int
+    calories: float
+    protein: float
+    fats: float
+    carb: float
+    price: float
+
+
+class MenuDishRow(NamedTuple):
+    """Строка меню вместе с блюдом; имена полей совпадают с ключами шаблонов меню"""
+    menu_id: int
+    date_menu: date
+    category_menu: str
+    type_menu: str
+    dish_id: int
+    dish_title: str
+    dish_out: int
+    dish_recipe: int
+    dish_calories: float
+    dish_protein: float
+    dish_fats: float
+    dish_carb: float
+    dish_price: float
+
+
+CLASS_ROW_COLUMNS = compile_columns(ClassRow, Class)
+DATASEND_ROW_COLUMNS = compile_columns(DataSendRow, DataSend)
+DISH_ROW_COLUMNS = compile_columns(DishRow, Dish)
+MENU_DISH_ROW_COLUMNS = compile_columns(
+    MenuDishRow, Menu, menu_id=Menu.id, dish_title=Dish.title, dish_out=Dish.out_gramm,
+    dish_recipe=Dish.recipe, dish_calories=Dish.calories, dish_protein=Dish.protein, dish_fats=Dish.fats,
+    dish_carb=Dish.carb, dish_price=Dish.price,
+)
@@ -1,11 +1,15 @@
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from functools import wraps
+from functools import cache, wraps
 from typing import AsyncGenerator, Annotated, Callable
+import asyncio
+import time
 
 from fastapi import Depends
-from sqlalchemy import Integer, func
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs, AsyncSession
+from sqlalchemy import Integer, func, text, event
+from sqlalchemy.exc import OperationalError, InterfaceError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs, AsyncSession, AsyncEngine
 from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped, declared_attr, class_mapper
 from loguru import logger
 
@@ -13,12 +17,110 @@ from app import config
 
 DATABASE_URL = config.get_link_db('postgresql+asyncpg')
 
-engine = create_async_engine(url=DATABASE_URL)
+def create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url=url,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        connect_args={
+            'statement_cache_size': config.DB_STATEMENT_CACHE_SIZE,
+            'prepared_statement_cache_size': config.DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+
+
+def create_read_session_maker(bind: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    """
+    Фабрика сессий для страниц только для чтения: без BEGIN/COMMIT
+    или с транзакцией READ ONLY, если это включено в настройках
+    """
+    if config.DB_READ_ONLY:
+        read_engine = bind.execution_options(postgresql_readonly=True)
+    else:
+        read_engine = bind.execution_options(isolation_level='AUTOCOMMIT')
+    return async_sessionmaker(read_engine, expire_on_commit=False)
+
+
+engine = create_engine(DATABASE_URL)
+replica_engines = [
+    create_engine(config.get_link_db('postgresql+asyncpg', *replica.split(':', 1)))
+    for replica in config.DB_REPLICAS
+]
+
+
+
+class QueryBudgetExceededError(AssertionError):
+    """Запрос или задача выполнили больше SQL-запросов, чем разрешено DB_QUERY_BUDGET"""
+
+
+class QueryStats:
+    """Счетчик SQL-запросов и времени БД в рамках одного запроса или задачи"""
+    __slots__ = ('name', 'count', 'duration')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.duration = 0.0
+
+
+query_stats: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время начала хранится в контексте выполнения: он живет один запрос, и при ошибке
+    # на соединении из пула ничего не остается
+    context.query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context.query_start_time
+    stats = query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += duration
+    if config.DB_SLOW_QUERY_MS and duration * 1000 >= config.DB_SLOW_QUERY_MS:
+        source = stats.name if stats is not None else '-'
+        logger.warning(f"Медленный запрос ({source}) {duration * 1000:.1f} мс: {statement}")
+
+
+for _engine in [engine, *replica_engines]:
+    event.listen(_engine.sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(_engine.sync_engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+@contextmanager
+def track_queries(name: str):
+    """
+    Считает SQL-запросы и время БД внутри блока, логирует итог
+    и проверяет лимит DB_QUERY_BUDGET, если он задан
+    :param name: имя маршрута или задачи для лога
+    """
+    stats = QueryStats(name)
+    token = query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        query_stats.reset(token)
+    logger.info(f"{name}: SQL-запросов {stats.count}, время БД {stats.duration * 1000:.1f} мс")
+    if config.DB_QUERY_BUDGET and stats.count > config.DB_QUERY_BUDGET:
+        raise QueryBudgetExceededError(
+            f"{name}: выполнено {stats.count} SQL-запросов при лимите {config.DB_QUERY_BUDGET}")
+
 
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+read_session_maker = create_read_session_maker(engine)
 str_uniq = Annotated[str, mapped_column(unique=True, nullable=False)]
 
 
+@cache
+def _column_keys(model: type) -> tuple[str, ...]:
+    # Колонки модели разбираются один раз на класс, а не при каждом вызове to_dict
+    return tuple(column.key for column in class_mapper(model).columns)
+
+
 class Base(AsyncAttrs, DeclarativeBase):
     __abstract__ = True
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -27,13 +129,44 @@ class Base(AsyncAttrs, DeclarativeBase):
 
     def to_dict(self) -> dict:
         """Универсальный метод для конвертации объекта SQLAlchemy в словарь"""
-        columns = class_mapper(self.__class__).columns
-        return {column.key: getattr(self, column.key) for column in columns}
+        return {key: getattr(self, key) for key in _column_keys(self.__class__)}
 
     @declared_attr.directive
     def __tablename__(cls) -> str:
         return cls.__name__.lower() + 's'
 
+async def warm_up_pool(size: int = config.DB_POOL_SIZE):
+    """
+    Открывает size соединений пула заранее, чтобы первые запросы не ждали подключения к БД
+    :param size: количество соединений
+    """
+    async def ping():
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+
+    await asyncio.gather(*(ping() for _ in range(size)))
+    logger.info(f"Пул соединений прогрет: {get_pool_stats()}")
+
+
+def _get_engine_pool_stats(bind: AsyncEngine) -> dict:
+    pool = bind.pool
+    return {
+        'size': pool.size(),
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': pool.overflow(),
+        'max_overflow': config.DB_MAX_OVERFLOW,
+    }
+
+
+def get_pool_stats() -> dict:
+    """Текущее состояние пулов соединений основной БД и реплик"""
+    stats = _get_engine_pool_stats(engine)
+    if replica_engines:
+        stats['replicas'] = [_get_engine_pool_stats(replica) for replica in replica_engines]
+    return stats
+
+
 async def create_all_tables():
     async with engine.begin() as connection:
         await connection.run_sync(Base.metadata.create_all)
@@ -44,8 +177,34 @@ class DatabaseSessionManager:
     Класс для управления асинхронными сессиями базы данных.
     """
 
-    def __init__(self, session_maker: async_sessionmaker[AsyncSession]):
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession],
+                 read_session_maker: async_sessionmaker[AsyncSession] | None = None,
+                 replica_session_makers: list[async_sessionmaker[AsyncSession]] | None = None):
         self.session_maker = session_maker
+        self.read_session_maker = read_session_maker or session_maker
+        self.replica_session_makers = replica_session_makers or []
+        self._replica_index = 0
+        self._replica_down_until: dict[int, float] = {}
+
+    def _choose_read_session_maker(self) -> tuple[int | None, async_sessionmaker[AsyncSession]]:
+        """
+        Выбирает реплику по кругу, пропуская недоступные.
+        Если доступных реплик нет, чтение идет в основную БД.
+        """
+        count = len(self.replica_session_makers)
+        now = time.monotonic()
+        for _ in range(count):
+            index = self._replica_index % count
+            self._replica_index += 1
+            if self._replica_down_until.get(index, 0) <= now:
+                return index, self.replica_session_makers[index]
+        return None, self.read_session_maker
+
+    def mark_replica_down(self, index: int) -> None:
+        if self._replica_down_until.get(index, 0) > time.monotonic():
+            return
+        self._replica_down_until[index] = time.monotonic() + config.DB_REPLICA_RETRY
+        logger.warning(f"Реплика {index} недоступна, чтение на {config.DB_REPLICA_RETRY} с переключено")
 
     @asynccontextmanager
     async def create_session(self) -> AsyncGenerator[AsyncSession, None]:
@@ -84,6 +243,35 @@ class DatabaseSessionManager:
             async with self.transaction(session):
                 yield session
 
+    @asynccontextmanager
+    async def read_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Сессия только для чтения.
+        Соединение берется из пула при первом запросе, COMMIT не выполняется.
+        При наличии реплик запросы распределяются между ними.
+        """
+        index, session_maker = self._choose_read_session_maker()
+        session = session_maker()
+        if index is not None:
+            # Соединение с репликой берется сразу: если она недоступна, чтение уходит в основную БД,
+            # а не в обработчик, который может проглотить ошибку и отрисовать пустую страницу
+            try:
+                await session.connection()
+            except (OperationalError, InterfaceError, OSError) as e:
+                await session.close()
+                self.mark_replica_down(index)
+                logger.warning(f"Чтение повторено в основной БД: {e}")
+                session = self.read_session_maker()
+        async with session:
+            yield session
+
+    async def get_read_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Зависимость для FastAPI, возвращающая сессию только для чтения.
+        """
+        async with self.read_session() as session:
+            yield session
+
     def connection(self):
         """
         Декоратор для управления сессией
@@ -92,17 +280,18 @@ class DatabaseSessionManager:
         def decorator(method):
             @wraps(method)
             async def wrapper():
-                async with self.session_maker() as session:
-                    try:
-                        result = await method(session=session)
-                        await session.commit()
-                        return result
-                    except Exception as e:
-                        await session.rollback()
-                        logger.error(f"Ошибка при выполнении транзакции: {e}")
-                        raise
-                    finally:
-                        await session.close()
+                with track_queries(method.__name__):
+                    async with self.session_maker() as session:
+                        try:
+                            result = await method(session=session)
+                            await session.commit()
+                            return result
+                        except Exception as e:
+                            await session.rollback()
+                            logger.error(f"Ошибка при выполнении транзакции: {e}")
+                            raise
+                        finally:
+                            await session.close()
 
             return wrapper
 
@@ -114,8 +303,35 @@ class DatabaseSessionManager:
         """Возвращает зависимость для FastAPI с поддержкой транзакций."""
         return Depends(self.get_transaction_session)
 
+    @property
+    def read_session_dependency(self) -> Callable:
+        """Возвращает зависимость для FastAPI с сессией только для чтения."""
+        return Depends(self.get_read_session)
+
+
+session_manager = DatabaseSessionManager(async_session_maker, read_session_maker,
+                                         [create_read_session_maker(replica) for replica in replica_engines])
+
+
+
+def is_replica_session(session: AsyncSession) -> bool:
+    """Сессия читает с реплики (у engine с опциями чтения тот же пул, что у исходного engine реплики)"""
+    pool = session.get_bind().engine.pool
+    return any(pool is replica.sync_engine.pool for replica in replica_engines)
+
+
+def _watch_replica(index: int, replica: AsyncEngine) -> None:
+    # Обрыв соединения с репликой посреди запроса помечает ее недоступной,
+    # даже если обработчик страницы перехватил ошибку
+    @event.listens_for(replica.sync_engine, 'handle_error')
+    def _on_replica_error(context) -> None:
+        if context.is_disconnect or isinstance(context.original_exception, OSError):
+            session_manager.mark_replica_down(index)
+
 
-session_manager = DatabaseSessionManager(async_session_maker)
+for replica_index, replica_engine in enumerate(replica_engines):
+    _watch_replica(replica_index, replica_engine)
 
 # Dependency для использования в маршрутах FastAPI
 SessionDep = session_manager.transaction_session_dependency
+ReadSessionDep = session_manager.read_session_dependency
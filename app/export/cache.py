@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import date
+
+import app.config as config
+from app.export.monitoring import ExportDish, build_monitoring_workbook
+from app.export.pool import export_pool
+
+
+def content_key(day: date, dishes: list[ExportDish]) -> str:
+    """
+    Ключ файла выгрузки по содержимому меню дня: одинаковое меню дает тот же ключ
+    :param day: дата меню
+    :param dishes: блюда меню в порядке выгрузки
+    :return:
+    """
+    return hashlib.sha256(repr((day.isoformat(), config.SCHOOL, tuple(dishes))).encode()).hexdigest()
+
+
+class ExportCache:
+    """
+    Кэш готовых файлов выгрузки мониторинга по ключу содержимого меню.
+    Для каждого дня хранится только последняя версия файла, всего - не больше max_size файлов
+    (вытесняются давно не использованные).
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._files: OrderedDict[str, bytes] = OrderedDict()
+        self._key_by_day: dict[date, str] = {}
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_build(self, day: date, dishes: list[ExportDish]) -> bytes:
+        """
+        Возвращает файл выгрузки за день из кэша, а если меню изменилось - формирует его в пуле.
+        Одновременные запросы одного и того же файла ждут одно формирование
+        :param day: дата меню
+        :param dishes: блюда меню категории '1-4 классы'
+        :return:
+        """
+        key = content_key(day, dishes)
+        data = self._files.get(key)
+        if data is not None:
+            self.hits += 1
+            self._files.move_to_end(key)
+            return data
+
+        self.misses += 1
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._build(key, day, dishes))
+            self._in_flight[key] = future
+        # shield: отмена одного запроса не должна отменять общее формирование файла
+        return await asyncio.shield(future)
+
+    async def _build(self, key: str, day: date, dishes: list[ExportDish]) -> bytes:
+        try:
+            data = await export_pool.run(build_monitoring_workbook, day, dishes)
+            if self.max_size > 0:
+                self._set(key, day, data)
+            return data
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _set(self, key: str, day: date, data: bytes) -> None:
+        old_key = self._key_by_day.get(day)
+        if old_key is not None and old_key != key:
+            self._files.pop(old_key, None)
+        self._key_by_day[day] = key
+        self._files[key] = data
+        self._files.move_to_end(key)
+        while len(self._files) > self.max_size:
+            self._files.popitem(last=False)
+        self._key_by_day = {d: k for d, k in self._key_by_day.items() if k in self._files}
+
+    def discard(self, day: date) -> None:
+        """Удаляет файл за день, например когда меню на день удалено"""
+        key = self._key_by_day.pop(day, None)
+        if key is not None:
+            self._files.pop(key, None)
+
+    def stats(self) -> dict:
+        return {'files': len(self._files), 'max_size': self.max_size, 'bytes': sum(map(len, self._files.values())),
+                'hits': self.hits, 'misses': self.misses, 'building': len(self._in_flight)}
+
+
+export_cache = ExportCache(max_size=config.EXPORT_CACHE_SIZE)
@@ -0,0 +1,151 @@
+import io
+import json
+import pickle
+import zipfile
+from datetime import date
+from functools import cache
+from typing import NamedTuple
+
+from openpyxl import Workbook
+from openpyxl.reader.excel import load_workbook
+
+import app.config as config
+from app.models.models import Menu
+
+TEMPLATE_PATH = 'templates/GGGG-MM-DD-sm.xlsx'
+# Раскладка разделов блюд по строкам шаблона
+LAYOUT_PATH = 'templates/GGGG-MM-DD-sm.json'
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Разобранный один раз шаблон, сериализованный для быстрого копирования
+_template: bytes | None = None
+
+
+class ExportDish(NamedTuple):
+    """Данные блюда меню для выгрузки, без объектов ORM, чтобы их можно было передать в другой процесс"""
+    type_menu: str
+    section: str | None
+    recipe: int
+    title: str
+    out_gramm: int
+    price: float
+    calories: float
+    protein: float
+    fats: float
+    carb: float
+
+    @classmethod
+    def from_menu(cls, menu: Menu) -> 'ExportDish':
+        dish = menu.dish
+        return cls(menu.type_menu, dish.section, dish.recipe, dish.title, dish.out_gramm, dish.price,
+                   dish.calories, dish.protein, dish.fats, dish.carb)
+
+
+def new_workbook() -> Workbook:
+    """
+    Возвращает новую копию шаблона мониторинга.
+    Шаблон читается с диска один раз; копия через pickle в разы быстрее повторного разбора xlsx.
+    """
+    global _template
+    if _template is None:
+        _template = pickle.dumps(load_workbook(filename=TEMPLATE_PATH))
+    return pickle.loads(_template)
+
+
+class RowSlot(NamedTuple):
+    """Строка шаблона и список записей (адрес ячейки, индекс поля ExportDish, пропускать ли ноль)"""
+    row: int
+    writes: tuple[tuple[str, int, bool], ...]
+
+
+class WritePlan(NamedTuple):
+    """Скомпилированная раскладка: для приема пищи и раздела - строки-кандидаты по порядку"""
+    sheet: str
+    day_cell: str
+    school_cell: str
+    sections: dict[tuple[str, str | None], tuple[RowSlot, ...]]
+    defaults: dict[str, tuple[RowSlot, ...]]
+
+
+def compile_layout(layout: dict) -> WritePlan:
+    """
+    Компилирует раскладку разделов блюд по строкам шаблона в план записи ячеек
+    :param layout: содержимое файла раскладки LAYOUT_PATH
+    :return:
+    """
+    columns = layout['columns']
+    skip_zero = set(layout.get('skip_zero', []))
+
+    def slots(rows: list[int], fields: list[str]) -> tuple[RowSlot, ...]:
+        return tuple(
+            RowSlot(row, tuple((f'{columns[field]}{row}', ExportDish._fields.index(field), field in skip_zero)
+                               for field in fields))
+            for row in rows
+        )
+
+    sections = {}
+    defaults = {}
+    for meal, meal_layout in layout['meals'].items():
+        for section, section_layout in meal_layout['sections'].items():
+            if isinstance(section_layout, list):
+                section_layout = {'rows': section_layout}
+            sections[(meal, section)] = slots(section_layout['rows'],
+                                              section_layout.get('fields', meal_layout['fields']))
+        defaults[meal] = slots(meal_layout['default'], meal_layout['fields'])
+    return WritePlan(layout['sheet'], layout['day_cell'], layout['school_cell'], sections, defaults)
+
+
+@cache
+def get_write_plan() -> WritePlan:
+    with open(LAYOUT_PATH, encoding='utf-8') as file:
+        return compile_layout(json.load(file))
+
+
+def build_monitoring_workbook(day: date, dishes: list[ExportDish]) -> bytes:
+    """
+    Заполняет шаблон мониторинга меню за день и возвращает содержимое xlsx.
+    Блюдо занимает первую еще не заполненную строку своего раздела, а если все заняты - последнюю.
+    :param day: дата меню
+    :param dishes: блюда меню категории '1-4 классы'
+    :return:
+    """
+    plan = get_write_plan()
+    wb = new_workbook()
+    sheet = wb[plan.sheet]
+    sheet[plan.day_cell] = day
+    sheet[plan.school_cell] = config.SCHOOL
+    filled = set()
+    for dish in dishes:
+        candidates = plan.sections.get((dish.type_menu, dish.section)) or plan.defaults.get(dish.type_menu)
+        if not candidates:
+            continue
+        slot = next((slot for slot in candidates if slot.row not in filled), candidates[-1])
+        filled.add(slot.row)
+        for coordinate, index, skip_zero in slot.writes:
+            value = dish[index]
+            if skip_zero and value == 0:
+                continue
+            sheet[coordinate] = value
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def build_zip(files: dict[str, bytes]) -> bytes:
+    """
+    Упаковывает файлы в zip-архив в памяти. xlsx уже сжат, поэтому файлы кладутся без сжатия
+    :param files: имя файла - содержимое
+    :return:
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def iter_bytes(data: bytes, chunk_size: int = 64 * 1024):
+    buffer = io.BytesIO(data)
+    while chunk := buffer.read(chunk_size):
+        yield chunk
@@ -0,0 +1,59 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from loguru import logger
+
+import app.config as config
+
+
+class ExportPool:
+    """
+    Пул для формирования файлов выгрузки вне цикла событий.
+    Ограничивает число одновременных задач и считает очередь ожидающих.
+    """
+
+    def __init__(self, workers: int, use_processes: bool = False):
+        self.workers = workers
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(workers)
+        self._running = 0
+        self._waiting = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export')
+        return self._executor
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """Выполняет func(*args) в пуле, дожидаясь свободного места"""
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), partial(func, *args))
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {'workers': self.workers, 'processes': self.use_processes,
+                'running': self._running, 'waiting': self._waiting}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Пул формирования выгрузок остановлен")
+
+
+export_pool = ExportPool(workers=config.EXPORT_WORKERS, use_processes=config.EXPORT_USE_PROCESSES)
@@ -2,7 +2,7 @@ from contextlib import asynccontextmanager
 from datetime import datetime
 from venv import logger
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -10,12 +10,22 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from starlette import status
 from starlette.responses import RedirectResponse, JSONResponse
 
+import app.config as config
 from app.auth.router import router as router_auth
+from app.auth.dependencies import get_current_user_read
+from app.auth.models import User
 from app.routes.food_monitoring import router as router_food
 from app.routes.san_monitoring import router as router_san
 from app.scheduler.datasend import add_datasend, update_class
 from app.scheduler.datasend import send_datasend
-from app.db import create_all_tables
+from app.scheduler.send_queue import send_queue
+from app.scheduler.exports import pregenerate_exports, stop_pregeneration
+from app.crud.cache import ref_caches
+from app.export.pool import export_pool
+from app.export.cache import export_cache
+from app.export.monitoring import get_write_plan
+from app.crud.invalidation import start_cache_listener, stop_cache_listener
+from app.db import create_all_tables, warm_up_pool, get_pool_stats, track_queries
 
 scheduler = AsyncIOScheduler()
 
@@ -29,6 +39,11 @@ async def lifespan(app: FastAPI):
         app (FastAPI): Экземпляр приложения FastAPI
     """
     try:
+        try:
+            await warm_up_pool()
+        except Exception as e:
+            logger.error(f"Ошибка прогрева пула соединений: {e}")
+        get_write_plan()
         # Настройка и запуск планировщика
         scheduler.add_job(
             create_all_tables,
@@ -53,6 +68,16 @@ async def lifespan(app: FastAPI):
             id='send_datasend',
             replace_existing=True
         )
+        scheduler.add_job(
+            pregenerate_exports,
+            'cron',
+            day_of_week='mon-fri',
+            hour='6-18',
+            minute='0',
+            next_run_time=datetime.now(),
+            id='pregenerate_exports',
+            replace_existing=True
+        )
         scheduler.add_job(
             update_class,
             'cron',
@@ -62,16 +87,33 @@ async def lifespan(app: FastAPI):
         )
         scheduler.start()
         logger.info("Планировщик обновления и передачи данных запущен")
+        send_queue.start()
+        if ref_caches and config.REF_CACHE_NOTIFY:
+            start_cache_listener()
         yield
     except Exception as e:
         logger.error(f"Ошибка инициализации планировщика: {e}")
     finally:
-        # Завершение работы планировщика
+        # Завершение работы очереди отправки и планировщика
+        await stop_cache_listener()
+        await send_queue.stop()
+        await stop_pregeneration()
+        export_pool.shutdown()
         scheduler.shutdown()
         logger.info("Планировщик остановлен")
 
 
 app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware('http')
+async def db_query_stats(request: Request, call_next):
+    with track_queries(f'{request.method} {request.url.path}') as stats:
+        response = await call_next(request)
+    response.headers['X-DB-Queries'] = str(stats.count)
+    response.headers['X-DB-Time'] = f'{stats.duration * 1000:.1f}'
+    return response
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 templates = Jinja2Templates(directory="templates")
@@ -105,6 +147,16 @@ async def not_found(request: Request):
     return templates.TemplateResponse(request=request, name='404.html', context={'title': title})
 
 
+@app.get('/db_pool')
+async def db_pool(user_data: User = Depends(get_current_user_read)):
+    return get_pool_stats()
+
+
+@app.get('/export_pool')
+async def export_pool_stats(user_data: User = Depends(get_current_user_read)):
+    return {**export_pool.stats(), 'cache': export_cache.stats()}
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     if exc.status_code == 401:
@@ -1,7 +1,7 @@
 import datetime
 from datetime import date
 
-from sqlalchemy import func, ForeignKey
+from sqlalchemy import func, ForeignKey, Index
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -11,7 +11,7 @@ from app.db import Base
 class Dish(Base):
     __tablename__ = 'dishes'
 
-    title: Mapped[str]
+    title: Mapped[str] = mapped_column(unique=True)
     recipe: Mapped[int]
     out_gramm: Mapped[int]
     price: Mapped[float]
@@ -29,6 +29,10 @@ class Dish(Base):
 
 class Menu(Base):
     __tablename__ = 'menus'
+    __table_args__ = (
+        Index('ix_menus_date_menu_category_menu', 'date_menu', 'category_menu'),
+        Index('ix_menus_dish_id', 'dish_id'),
+    )
 
     date_menu: Mapped[date] = mapped_column(server_default=func.now())
     type_menu: Mapped[str]
@@ -56,6 +60,7 @@ class Class(Base):
 
 class DataSend(Base):
     __tablename__ = 'datasends'
+    __table_args__ = (Index('ix_datasends_created_at', 'created_at'),)
 
     date_send: Mapped[date] = mapped_column(unique=True)
     count_all_ill: Mapped[int]
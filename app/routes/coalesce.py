@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple
+
+from fastapi import Request
+from loguru import logger
+from starlette.responses import Response
+
+
+class CachedPage(NamedTuple):
+    """Отрисованная страница, которую можно отдать нескольким запросам"""
+    status_code: int
+    body: bytes
+    headers: dict
+
+    @classmethod
+    def from_response(cls, response: Response) -> 'CachedPage':
+        return cls(response.status_code, response.body, dict(response.headers))
+
+    def to_response(self) -> Response:
+        return Response(content=self.body, status_code=self.status_code, headers=self.headers)
+
+
+def coalesce_key(request: Request, *parts: Hashable) -> tuple:
+    """
+    Ключ объединения запросов: путь с параметрами, адрес сайта (для url_for в шаблонах)
+    и признак авторизации
+    """
+    return request.url.path, str(request.base_url), 'users_access_token' in request.cookies, *parts
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые вычисления: пока результат по ключу считается,
+    остальные запросы ждут его же, а не запускают свое.
+    При stale > 0 готовый результат отдается еще stale секунд, а пересчет идет в фоне.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self._results: dict[Hashable, tuple[float, Any]] = {}
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]], stale: float = 0) -> Any:
+        if stale > 0:
+            result = self._results.get(key)
+            if result is not None and time.monotonic() - result[0] < stale:
+                if key not in self._in_flight:
+                    self._start(key, compute, stale)
+                return result[1]
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = self._start(key, compute, stale)
+        # shield: отмена одного ожидающего запроса не должна отменять общий расчет
+        return await asyncio.shield(future)
+
+    def _start(self, key: Hashable, compute: Callable[[], Awaitable[Any]], stale: float) -> asyncio.Future:
+        future = asyncio.ensure_future(self._compute(key, compute, stale))
+        future.add_done_callback(self._log_error)
+        self._in_flight[key] = future
+        return future
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]], stale: float) -> Any:
+        try:
+            value = await compute()
+            if stale > 0:
+                now = time.monotonic()
+                self._results = {k: v for k, v in self._results.items() if now - v[0] < stale}
+                self._results[key] = (now, value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    @staticmethod
+    def _log_error(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Ошибка при общем вычислении страницы: {future.exception()}")
+
+
+flights = SingleFlight()
@@ -1,149 +1,187 @@
-import os
-from datetime import date, datetime
+import asyncio
+from datetime import date, datetime, time, timedelta
 from typing import Annotated
 from venv import logger
 
-from fastapi import APIRouter, Request, Form, Depends
-from openpyxl.reader.excel import load_workbook
+from fastapi import APIRouter, Request, Form, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from starlette.responses import HTMLResponse, RedirectResponse, FileResponse
+from starlette.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
 import app.config as config
-from app.db import SessionDep
+from app.db import SessionDep, ReadSessionDep, session_manager
 from app.crud.crud import MenuCRUD, DishCRUD
-from app.auth.dependencies import get_current_user
+from app.auth.dependencies import get_current_user, get_current_user_read
 from app.auth.models import User
-from app.schemas.dishes import DishPydanticIn, DishPydanticTitle, DishPydanticEdit
+from app.schemas.dishes import DishPydanticIn, DishPydanticEdit
 from app.schemas.menus import MenuPydanticListIn, MenuPydantic, MenuPydanticEdit
+from app.routes.http_cache import make_etag, cache_headers, not_modified
+from app.routes.coalesce import flights, coalesce_key, CachedPage
+from app.export.monitoring import build_zip, iter_bytes, XLSX_MEDIA_TYPE, ExportDish
+from app.export.cache import export_cache
+from app.scheduler.exports import mark_exports_dirty
 
 templates = Jinja2Templates(directory="templates")
 router = APIRouter(prefix='/nutritions', tags=['food'])
 
 
 @router.get('/', response_class=HTMLResponse)
-async def nutritions(request: Request, session: AsyncSession = SessionDep):
+async def nutritions(request: Request, month: Annotated[str | None, Query(pattern=r'^\d{4}-\d{2}$')] = None):
+    """
+    Список дат с меню: по умолчанию вчера и три дня вперед, с параметром month=ГГГГ-ММ - весь месяц
+    """
+    today = date.today()
+    if month:
+        try:
+            date_from = datetime.strptime(month, "%Y-%m").date()
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Месяц должен быть в формате ГГГГ-ММ')
+        date_to = (date_from + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    else:
+        date_from, date_to = today - timedelta(days=1), today + timedelta(days=3)
+
+    async def load_version():
+        async with session_manager.read_session() as session:
+            return await MenuCRUD.get_version(session=session, date_from=date_from, date_to=date_to)
+
+    version = await flights.run(('nutritions', today, date_from, date_to), load_version,
+                                stale=config.COALESCE_STALE_SECONDS)
+    last_modified = max(filter(None, [version.last_modified, datetime.combine(today, time.min).astimezone()]))
+    etag = make_etag('nutritions', today, date_from, date_to, version.count, version.last_modified)
+    response = not_modified(request, etag, last_modified)
+    if response:
+        return response
+
+    async def render():
+        async with session_manager.read_session() as session:
+            response = await nutritions_page(request, session, today, date_from, date_to, month,
+                                             headers=cache_headers(etag, last_modified))
+            return CachedPage.from_response(response)
+
+    page = await flights.run(coalesce_key(request, etag), render, stale=config.COALESCE_STALE_SECONDS)
+    return page.to_response()
+
+
+async def nutritions_page(request: Request, session: AsyncSession, today: date, date_from: date, date_to: date,
+                          month: str | None, headers: dict):
     title = 'Питание Школы'
     menu_list = []
-    current_date = date.today().isoformat()
+    current_date = today.isoformat()
     try:
-        all_menus = await MenuCRUD.get_all(session=session)
-        if all_menus:
-            for menu in all_menus:
-                cur_menu = str(menu.date_menu)
-                if cur_menu not in menu_list:
-                    menu_list.append(cur_menu)
-        menu_list.sort()
+        menu_dates = await MenuCRUD.get_menu_dates(session=session, date_from=date_from, date_to=date_to)
+        menu_list = [menu_date.isoformat() for menu_date in menu_dates]
     except Exception as e:
         logger.error(e)
 
     return templates.TemplateResponse(request=request, name='nutritions.html',
-                                      context={'title': title, 'title_school': config.SCHOOL, 'date_current': datetime.today(), 'date_todey': current_date, 'menu_list': menu_list})
+                                      context={'title': title, 'title_school': config.SCHOOL, 'date_current': datetime.today(), 'date_todey': current_date, 'menu_list': menu_list,
+                                               'month': month, 'current_month': today.strftime('%Y-%m')},
+                                      headers=headers)
 
 
 @router.get('/admin', response_class=HTMLResponse)
-async def admin_nutritions(request: Request, user_data: User = Depends(get_current_user),
-                           session: AsyncSession = SessionDep):
+async def admin_nutritions(request: Request, user_data: User = Depends(get_current_user_read),
+                           session: AsyncSession = ReadSessionDep):
     title = 'Панель управления технолога'
     dishes = {}
-    dishes_db = await DishCRUD.get_all(session=session)
-    for row in dishes_db:
-        dish = row.to_dict()
-        if dish['title'] not in dishes:
-            dishes[dish['title']] = []
-        dishes[dish['title']].append({
-            'id': dish['id'],
-            'recipe': dish['recipe'],
-            'out_gramm': dish['out_gramm'],
-            'calories': dish['calories'],
-            'protein': dish['protein'],
-            'fats': dish['fats'],
-            'carb': dish['carb'],
-            'price': dish['price'],
-        })
+    dishes_db = await DishCRUD.get_dish_rows(session=session)
+    for dish in dishes_db:
+        if dish.title not in dishes:
+            dishes[dish.title] = []
+        dishes[dish.title].append(dish._asdict())
 
     menus = {}
-    menus_db = await MenuCRUD.get_all_menus_by_five_day(session=session)
-    result_menus = {}
+    date_from, date_to = MenuCRUD.get_five_day_range()
+    menus_db = await MenuCRUD.get_menu_rows_by_range(session=session, date_from=date_from, date_to=date_to)
+    for menu in menus_db:
+        date = menu.date_menu.isoformat()
+        if date not in menus:
+            menus[date] = {}
+        if menu.category_menu not in menus[date]:
+            menus[date][menu.category_menu] = {}
+        if menu.type_menu not in menus[date][menu.category_menu]:
+            menus[date][menu.category_menu][menu.type_menu] = []
+        menus[date][menu.category_menu][menu.type_menu].append(menu._asdict())
 
-    if menus_db:
-        for menu in menus_db:
-            date = menu.date_menu.isoformat()
-            if date not in result_menus:
-                result_menus[date] = {}
-            if date not in menus:
-                menus[date] = {}
-            if menu.category_menu not in menus[date]:
-                menus[date][menu.category_menu] = {}
-            if menu.type_menu not in menus[date][menu.category_menu]:
-                menus[date][menu.category_menu][menu.type_menu] = []
-            dish = await DishCRUD.get_dish_by_id(session=session, dish_id=menu.dish_id)
-
-            menus[date][menu.category_menu][menu.type_menu].append({
-                'menu_id': menu.id,
-                'dish_id': dish.id,
-                'dish_title': dish.title,
-                'dish_out': dish.out_gramm,
-                'dish_recipe': dish.recipe,
-                'dish_calories': dish.calories,
-                'dish_protein': dish.protein,
-                'dish_fats': dish.fats,
-                'dish_carb': dish.carb,
-                'dish_price': dish.price,
-            })
-            if menu.category_menu == '1-4 классы' and menu.type_menu == 'Завтрак':
-                result_menus[date]['cal_breakfast'] = result_menus[date].get('cal_breakfast', 0) + dish.calories
-                result_menus[date]['out_breakfast'] = result_menus[date].get('out_breakfast', 0) + dish.out_gramm
-
-            if menu.category_menu == '1-4 классы' and menu.type_menu == 'Обед':
-                result_menus[date]['cal_lunch'] = result_menus[date].get('cal_lunch', 0) + dish.calories
-                result_menus[date]['out_lunch'] = result_menus[date].get('out_lunch', 0) + dish.out_gramm
+    # Итоги по всем категориям и приемам пищи считает БД
+    totals = {}
+    result_menus = {}
+    totals_db = await MenuCRUD.get_nutrition_totals(session=session, date_from=date_from, date_to=date_to)
+    for row in totals_db:
+        day = row.date_menu.isoformat()
+        totals.setdefault(day, {}).setdefault(row.category_menu, {})[row.type_menu] = row._asdict()
+        result_menus.setdefault(day, {})
+        if row.category_menu == '1-4 классы' and row.type_menu == 'Завтрак':
+            result_menus[day]['cal_breakfast'] = row.calories
+            result_menus[day]['out_breakfast'] = row.out_gramm
+        if row.category_menu == '1-4 классы' and row.type_menu == 'Обед':
+            result_menus[day]['cal_lunch'] = row.calories
+            result_menus[day]['out_lunch'] = row.out_gramm
 
     return templates.TemplateResponse(request=request, name='admin_nutritions.html',
                                       context={'title': title, 'title_school': config.SCHOOL, 'date_current': datetime.today(), 'dishes': dishes, 'menus': menus,
-                                               'result': result_menus})
+                                               'result': result_menus, 'totals': totals})
 
 
 @router.get('/{date_menu}', response_class=HTMLResponse)
-async def menu_in_date(date_menu: str, request: Request, session: AsyncSession = SessionDep):
-    title = 'Меню на ' + str(date_menu)
+async def menu_in_date(date_menu: str, request: Request):
     current_menu = datetime.strptime(date_menu, "%Y-%m-%d").date()
-    menus_db_by_day = await MenuCRUD.get_all_menus_by_one_day(session=session, day=current_menu)
+    today = date.today()
+
+    async def load_version():
+        async with session_manager.read_session() as session:
+            return await MenuCRUD.get_version(session=session, date_from=current_menu, date_to=current_menu)
+
+    version = await flights.run(('menu', current_menu), load_version, stale=config.COALESCE_STALE_SECONDS)
+    last_modified = max(filter(None, [version.last_modified, datetime.combine(today, time.min).astimezone()]))
+    etag = make_etag('menu', current_menu, today, version.count, version.last_modified)
+    response = not_modified(request, etag, last_modified)
+    if response:
+        return response
+
+    async def render():
+        async with session_manager.read_session() as session:
+            response = await menu_in_date_page(request, session, current_menu, today,
+                                               headers=cache_headers(etag, last_modified))
+            return CachedPage.from_response(response)
+
+    page = await flights.run(coalesce_key(request, etag), render, stale=config.COALESCE_STALE_SECONDS)
+    return page.to_response()
+
+
+async def menu_in_date_page(request: Request, session: AsyncSession, current_menu: date, today: date, headers: dict):
+    title = 'Меню на ' + current_menu.isoformat()
+    menus_db_by_day = await MenuCRUD.get_menu_rows_by_range(session=session, date_from=current_menu,
+                                                            date_to=current_menu)
     menu_today = {}
-    if menus_db_by_day:
-        for menu in menus_db_by_day:
-            if menu.category_menu not in menu_today:
-                menu_today[menu.category_menu] = {}
-            if menu.type_menu not in menu_today[menu.category_menu]:
-                menu_today[menu.category_menu][menu.type_menu] = []
-            dish = await DishCRUD.get_dish_by_id(session=session, dish_id=menu.dish_id)
-            if dish:
-                menu_today[menu.category_menu][menu.type_menu].append({
-                    'dish_name': dish.title,
-                    'out_gramm': dish.out_gramm,
-                    'calories': dish.calories,
-                    'price': dish.price,
-                })
+    for menu in menus_db_by_day:
+        if menu.category_menu not in menu_today:
+            menu_today[menu.category_menu] = {}
+        if menu.type_menu not in menu_today[menu.category_menu]:
+            menu_today[menu.category_menu][menu.type_menu] = []
+        menu_today[menu.category_menu][menu.type_menu].append({
+            'dish_name': menu.dish_title,
+            'out_gramm': menu.dish_out,
+            'calories': menu.dish_calories,
+            'price': menu.dish_price,
+        })
 
     return templates.TemplateResponse(request=request, name='menu_today.html',
-                                      context={'title': title, 'title_school': config.SCHOOL, 'date_current': date.today(), 'menu': menu_today})
+                                      context={'title': title, 'title_school': config.SCHOOL, 'date_current': today, 'menu': menu_today},
+                                      headers=headers)
 
 
 @router.post('/send_dish/')
 async def create_dish(request: Request, data: Annotated[DishPydanticIn, Form()],
                       user_data: User = Depends(get_current_user), session: AsyncSession = SessionDep):
     try:
-        dish = await DishCRUD.get_dish_by_name(session=session, dish_name=data.title)
-        if dish:
-            await DishCRUD.update(session=session, filters=DishPydanticTitle(title=data.title), values=data)
-            redirect_url = request.url_for('admin_nutritions').include_query_params(msg="Succesfully update!")
-            return RedirectResponse(redirect_url, status_code=status.HTTP_303_SEE_OTHER)
-
-        else:
-            await DishCRUD.add(session=session, values=data)
-            redirect_url = request.url_for('admin_nutritions').include_query_params(msg="Succesfully created!")
-            return RedirectResponse(redirect_url, status_code=status.HTTP_303_SEE_OTHER)
+        mark_exports_dirty(session)
+        dish = await DishCRUD.upsert(session=session, values=data, conflict_keys=['title'])
+        # У новой записи created_at и updated_at совпадают, при обновлении updated_at сдвигается
+        msg = "Succesfully created!" if dish.created_at == dish.updated_at else "Succesfully update!"
+        redirect_url = request.url_for('admin_nutritions').include_query_params(msg=msg)
+        return RedirectResponse(redirect_url, status_code=status.HTTP_303_SEE_OTHER)
     except Exception as e:
         logger.error(e)
     return templates.TemplateResponse(request=request, name='404.html')
@@ -155,12 +193,12 @@ async def create_menu(request: Request, data: Annotated[MenuPydanticListIn, Form
                       session: AsyncSession = SessionDep):
     menu_dict = data.model_dump()
     try:
-        for id in menu_dict['dishs_ids']:
-            await MenuCRUD.add(session=session, values=MenuPydantic(
-                date_menu=menu_dict['date_menu'],
-                type_menu=menu_dict['type_menu'],
-                category_menu=menu_dict['category_menu'],
-                dish_id=id))
+        mark_exports_dirty(session)
+        await MenuCRUD.add_many(session=session, values=[MenuPydantic(
+            date_menu=menu_dict['date_menu'],
+            type_menu=menu_dict['type_menu'],
+            category_menu=menu_dict['category_menu'],
+            dish_id=id) for id in menu_dict['dishs_ids'] or []])
     except Exception as e:
         logger.error(e)
     redirect_url = request.url_for('admin_nutritions').include_query_params(msg="Succesfully created!")
@@ -172,6 +210,7 @@ async def delete_dish(request: Request, data: Annotated[DishPydanticEdit, Form()
                       user_data: User = Depends(get_current_user), session: AsyncSession = SessionDep):
     id_dish = data.id
     try:
+        mark_exports_dirty(session)
         await DishCRUD.delete(session=session, filters=DishPydanticEdit(id=id_dish))
     except Exception as e:
         logger.error(e)
@@ -184,6 +223,7 @@ async def delete_menu(request: Request, data: Annotated[MenuPydanticEdit, Form()
                       user_data: User = Depends(get_current_user), session: AsyncSession = SessionDep):
     id_menu = data.id
     try:
+        mark_exports_dirty(session)
         await MenuCRUD.delete(session=session, filters=MenuPydanticEdit(id=id_menu))
     except Exception as e:
         logger.error(e)
@@ -192,165 +232,37 @@ async def delete_menu(request: Request, data: Annotated[MenuPydanticEdit, Form()
 
 
 @router.get('/download/{date_menu}')
-async def get_file_menu_for_monitoring(date_menu: str, session: AsyncSession = SessionDep):
-    wb = load_workbook(filename='templates/GGGG-MM-DD-sm.xlsx')
-    sheet = wb['1']
+async def get_file_menu_for_monitoring(date_menu: str):
     current_date_menu = datetime.strptime(date_menu, "%Y-%m-%d").date()
-    sheet['J1'] = current_date_menu
-    sheet['B1'] = config.SCHOOL
     result_filename = date_menu + '-sm.xlsx'
-    menus_db_by_day = await MenuCRUD.get_category_menus_one_day(session=session, day=current_date_menu)
-    if menus_db_by_day:
-        for menu in menus_db_by_day:
-            dish = await DishCRUD.get_dish_by_id(session=session, dish_id=menu.dish_id)
-            if menu.type_menu == 'Завтрак':
-                if dish.section == 'гор.блюдо':
-                    if dish.recipe != 0:
-                        sheet['C4'] = dish.recipe
-                    sheet['D4'] = dish.title
-                    sheet['E4'] = dish.out_gramm
-                    sheet['F4'] = dish.price
-                    sheet['G4'] = dish.calories
-                    sheet['H4'] = dish.protein
-                    sheet['I4'] = dish.fats
-                    sheet['J4'] = dish.carb
-                elif dish.section == 'гор.напиток':
-                    if dish.recipe != 0:
-                        sheet['C5'] = dish.recipe
-                    sheet['D5'] = dish.title
-                    sheet['E5'] = dish.out_gramm
-                    sheet['F5'] = dish.price
-                    sheet['G5'] = dish.calories
-                    sheet['H5'] = dish.protein
-                    sheet['I5'] = dish.fats
-                    sheet['J5'] = dish.carb
-                elif dish.section == 'Хлеб':
-                    sheet['D6'] = dish.title
-                    sheet['E6'] = dish.out_gramm
-                    sheet['F6'] = dish.price
-                    sheet['G6'] = dish.calories
-                    sheet['H6'] = dish.protein
-                    sheet['I6'] = dish.fats
-                    sheet['J6'] = dish.carb
-                elif dish.section == 'Нет' and not sheet['D7'].value:
-                    if dish.recipe != 0:
-                        sheet['C7'] = dish.recipe
-                    sheet['D7'] = dish.title
-                    sheet['E7'] = dish.out_gramm
-                    sheet['F7'] = dish.price
-                    sheet['G7'] = dish.calories
-                    sheet['H7'] = dish.protein
-                    sheet['I7'] = dish.fats
-                    sheet['J7'] = dish.carb
-                else:
-                    if dish.recipe != 0:
-                        sheet['C8'] = dish.recipe
-                    sheet['D8'] = dish.title
-                    sheet['E8'] = dish.out_gramm
-                    sheet['F8'] = dish.price
-                    sheet['G8'] = dish.calories
-                    sheet['H8'] = dish.protein
-                    sheet['I8'] = dish.fats
-                    sheet['J8'] = dish.carb
-            elif menu.type_menu == 'Обед':
-                if dish.section == 'фрукты':
-                    if dish.recipe != 0:
-                        sheet['C9'] = dish.recipe
-                    sheet['D9'] = dish.title
-                    sheet['E9'] = dish.out_gramm
-                    sheet['G9'] = dish.calories
-                    sheet['H9'] = dish.protein
-                    sheet['I9'] = dish.fats
-                    sheet['J9'] = dish.carb
-                elif dish.section == 'закуска':
-                    if dish.recipe != 0:
-                        sheet['C12'] = dish.recipe
-                    sheet['D12'] = dish.title
-                    sheet['E12'] = dish.out_gramm
-                    sheet['G12'] = dish.calories
-                    sheet['H12'] = dish.protein
-                    sheet['I12'] = dish.fats
-                    sheet['J12'] = dish.carb
-                elif dish.section == '1 блюдо':
-                    if dish.recipe != 0:
-                        sheet['C13'] = dish.recipe
-                    sheet['D13'] = dish.title
-                    sheet['E13'] = dish.out_gramm
-                    sheet['G13'] = dish.calories
-                    sheet['H13'] = dish.protein
-                    sheet['I13'] = dish.fats
-                    sheet['J13'] = dish.carb
-                elif dish.section == '2 блюдо':
-                    if dish.recipe != 0:
-                        sheet['C14'] = dish.recipe
-                    sheet['D14'] = dish.title
-                    sheet['E14'] = dish.out_gramm
-                    sheet['G14'] = dish.calories
-                    sheet['H14'] = dish.protein
-                    sheet['I14'] = dish.fats
-                    sheet['J14'] = dish.carb
-                elif dish.section == 'гарнир':
-                    if dish.recipe != 0:
-                        sheet['C15'] = dish.recipe
-                    sheet['D15'] = dish.title
-                    sheet['E15'] = dish.out_gramm
-                    sheet['G15'] = dish.calories
-                    sheet['H15'] = dish.protein
-                    sheet['I15'] = dish.fats
-                    sheet['J15'] = dish.carb
-                elif dish.section == 'напиток':
-                    if dish.recipe != 0:
-                        sheet['C16'] = dish.recipe
-                    sheet['D16'] = dish.title
-                    sheet['E16'] = dish.out_gramm
-                    sheet['G16'] = dish.calories
-                    sheet['H16'] = dish.protein
-                    sheet['I16'] = dish.fats
-                    sheet['J16'] = dish.carb
-                elif dish.section == 'хлеб бел.':
-                    sheet['D17'] = dish.title
-                    sheet['E17'] = dish.out_gramm
-                    sheet['G17'] = dish.calories
-                    sheet['H17'] = dish.protein
-                    sheet['I17'] = dish.fats
-                    sheet['J17'] = dish.carb
-                elif dish.section == 'хлеб черн.':
-                    sheet['D18'] = dish.title
-                    sheet['E18'] = dish.out_gramm
-                    sheet['G18'] = dish.calories
-                    sheet['H18'] = dish.protein
-                    sheet['I18'] = dish.fats
-                    sheet['J18'] = dish.carb
-                elif dish.section == 'Нет' and not sheet['D19'].value:
-                    if dish.recipe != 0:
-                        sheet['C19'] = dish.recipe
-                    sheet['D19'] = dish.title
-                    sheet['E19'] = dish.out_gramm
-                    sheet['G19'] = dish.calories
-                    sheet['H19'] = dish.protein
-                    sheet['I19'] = dish.fats
-                    sheet['J19'] = dish.carb
-                else:
-                    if dish.recipe != 0:
-                        sheet['C20'] = dish.recipe
-                    sheet['D20'] = dish.title
-                    sheet['E20'] = dish.out_gramm
-                    sheet['G20'] = dish.calories
-                    sheet['H20'] = dish.protein
-                    sheet['I20'] = dish.fats
-                    sheet['J20'] = dish.carb
-
-    patch_file = os.path.join('tmp', result_filename)
-    try:
+    # Соединение возвращается в пул до формирования файла
+    async with session_manager.read_session() as session:
+        menus_db_by_day = await MenuCRUD.get_category_menus_with_dish_one_day(session=session, day=current_date_menu)
+        dishes = [ExportDish.from_menu(menu) for menu in menus_db_by_day]
+    data = await export_cache.get_or_build(current_date_menu, dishes)
+    return StreamingResponse(iter_bytes(data), media_type=XLSX_MEDIA_TYPE,
+                             headers={'Content-Disposition': f'attachment; filename="{result_filename}"',
+                                      'Content-Length': str(len(data))})
 
-        if os.path.exists('tmp'):
-            wb.save(patch_file)
-            logger.info('Создаем файл в папке - tmp')
-        else:
-            os.mkdir('tmp')
-            logger.info('Создали папку, т.к. ее нет')
-            wb.save(patch_file)
-            logger.info('Создаем файл в папке - tmp')
-    except Exception as e:
-        logger.error(e)
-    return FileResponse(path=patch_file, filename=result_filename, media_type='multipart/form-data')
+
+@router.get('/download/{date_from}/{date_to}')
+async def get_files_menu_for_monitoring(date_from: str, date_to: str):
+    first_day = datetime.strptime(date_from, "%Y-%m-%d").date()
+    last_day = datetime.strptime(date_to, "%Y-%m-%d").date()
+    if last_day < first_day or (last_day - first_day).days >= config.EXPORT_MAX_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f'Период выгрузки должен быть от 1 до {config.EXPORT_MAX_DAYS} дней')
+    dishes_by_day: dict[date, list[ExportDish]] = {}
+    # Соединение возвращается в пул до формирования файлов
+    async with session_manager.read_session() as session:
+        menus_db = await MenuCRUD.get_category_menus_with_dish_by_range(session=session, date_from=first_day,
+                                                                        date_to=last_day)
+        for menu in menus_db:
+            dishes_by_day.setdefault(menu.date_menu, []).append(ExportDish.from_menu(menu))
+
+    files = await asyncio.gather(*(export_cache.get_or_build(day, dishes) for day, dishes in dishes_by_day.items()))
+    data = build_zip({day.isoformat() + '-sm.xlsx': file for day, file in zip(dishes_by_day, files)})
+    result_filename = f'{date_from}_{date_to}-sm.zip'
+    return StreamingResponse(iter_bytes(data), media_type='application/zip',
+                             headers={'Content-Disposition': f'attachment; filename="{result_filename}"',
+                                      'Content-Length': str(len(data))})
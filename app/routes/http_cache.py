@@ -0,0 +1,50 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+from starlette import status
+from starlette.responses import Response
+
+
+def make_etag(*parts) -> str:
+    """
+    Слабый ETag из версии данных страницы
+    :param parts: значения, от которых зависит содержимое страницы
+    :return:
+    """
+    digest = hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def cache_headers(etag: str, last_modified: datetime | None) -> dict:
+    """Заголовки условного GET для ответа 200 и 304"""
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def not_modified(request: Request, etag: str, last_modified: datetime | None) -> Response | None:
+    """
+    Возвращает ответ 304, если у клиента актуальная версия страницы, иначе None.
+    If-None-Match имеет приоритет над If-Modified-Since.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        if etag in tags or '*' in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, last_modified))
+        return None
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, last_modified))
+    return None
@@ -1,5 +1,5 @@
 import datetime
-from datetime import date, timedelta
+from datetime import date
 from typing import Annotated
 from venv import logger
 
@@ -11,12 +11,15 @@ from starlette.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
 import app.config as config
-from app.db import SessionDep
+from app.db import SessionDep, ReadSessionDep, session_manager
 from app.crud.crud import ClassCRUD, DataSendCRUD
+from app.scheduler.datasend import mark_datasend_dirty
+from app.scheduler.send_queue import send_queue, get_class_send_values
+from app.routes.coalesce import flights, coalesce_key, CachedPage
 from app.schemas.classes import ClassPydanticIn, ClassPydanticOne, ClassDataPydanticAdd, ClassDataPydanticSend, \
-    ClassDataPydantic, ClassDataPydanticOpen, ClassDataPyndantiClosed, \
+    ClassDataPydanticOpen, ClassDataPyndantiClosed, \
     ClassesDataPydanticClosed
-from app.auth.dependencies import get_current_user
+from app.auth.dependencies import get_current_user, get_current_user_read
 from app.auth.models import User
 
 templates = Jinja2Templates(directory="templates")
@@ -25,7 +28,16 @@ router = APIRouter(prefix='/monitoring', tags=['sanmon'])
 
 
 @router.get('/', response_class=HTMLResponse)
-async def monitoring(request: Request, session: AsyncSession = SessionDep):
+async def monitoring(request: Request):
+    async def render():
+        async with session_manager.read_session() as session:
+            return CachedPage.from_response(await monitoring_page(request, session))
+
+    page = await flights.run(coalesce_key(request), render, stale=config.COALESCE_STALE_SECONDS)
+    return page.to_response()
+
+
+async def monitoring_page(request: Request, session: AsyncSession):
     title = 'Санитарно-эпидемиологическая обстановка в Школе'
 
     current_date = date.today()
@@ -34,51 +46,28 @@ async def monitoring(request: Request, session: AsyncSession = SessionDep):
     count_all_ill = 0
     count_all = 0
 
-    count_closed_classes = 0
     school_data = [False]
     try:
-        all_classes = await ClassCRUD.get_all(session=session)
+        totals = await ClassCRUD.get_school_totals(session=session, day=current_date)
+        count_all_ill = totals.count_all_ill
+        count_all = totals.count_all
+        if totals.count_classes and totals.count_closed == totals.count_classes:
+            school_data = [True, totals.date_open]
+
+        all_classes = await ClassCRUD.get_class_rows(session=session)
         if all_classes:
             count = 1
             for _class in all_classes:
                 if len(_class.name_class) == 2:
-                    count_all += _class.count_class
-                    count_all_ill += _class.count_ill
                     if _class.name_class not in classes_list:
                         classes_list[_class.name_class] = []
-                    classes_list[_class.name_class].append({
-                        'id': count,
-                        'man_class': _class.man_class,
-                        'count_ill': _class.count_ill,
-                        'count_class': _class.count_class,
-                        'proc_ill': _class.proc_ill,
-                        'closed': _class.closed,
-                        'date_closed': _class.date_closed,
-                        'date_open': _class.date_open,
-                        'date': _class.date
-                    })
+                    classes_list[_class.name_class].append({'id': count, **_class._asdict()})
                     count += 1
             for count_id, _class in enumerate(all_classes, start=count):
-                if _class.closed:
-                    count_closed_classes += 1
-                    school_data.append(_class.date_open)
                 if len(_class.name_class) == 3:
-                    count_all += _class.count_class
-                    count_all_ill += _class.count_ill
                     if _class.name_class not in classes_list:
                         classes_list[_class.name_class] = []
-                    classes_list[_class.name_class].append({
-                        'id': count_id,
-                        'man_class': _class.man_class,
-                        'count_ill': _class.count_ill,
-                        'count_class': _class.count_class,
-                        'proc_ill': _class.proc_ill,
-                        'closed': _class.closed,
-                        'date_closed': _class.date_closed,
-                        'date_open': _class.date_open,
-                        'date': _class.date
-                    })
-            school_data[0] = True if count_closed_classes == len(all_classes) else False
+                    classes_list[_class.name_class].append({'id': count_id, **_class._asdict()})
     except Exception as e:
         logger.error(e)
 
@@ -86,9 +75,7 @@ async def monitoring(request: Request, session: AsyncSession = SessionDep):
 
     send_status = False
     try:
-        sending_mail_data = await DataSendCRUD.get_sends_status_by_from_date(session=session, day=current_date)
-        if sending_mail_data:
-            send_status = sending_mail_data.sending
+        send_status = bool(await DataSendCRUD.get_sending_status(session=session, day=current_date))
     except Exception as e:
         logger.error(e)
     status = f'Данные на {current_date:%d.%m.%Y} отправлены в Cектор' if send_status else 'Данные не отправлены в сектор'
@@ -109,23 +96,19 @@ async def create_class(request: Request, data: Annotated[ClassPydanticIn, Form()
     man_class = data.man_class
     count_class = data.count_class
     try:
-        current_class = await ClassCRUD.get_class_by_one(session=session, name_class=name_class)
-        if current_class:
-            values = data.model_dump()
-            await ClassCRUD.update(session=session, filters=ClassPydanticOne(name_class=name_class),
-                                   values=ClassPydanticIn(**values))
-        else:
-            await ClassCRUD.add(session=session,
-                                values=ClassDataPydanticAdd(
-                                    name_class=name_class,
-                                    man_class=man_class,
-                                    count_class=count_class,
-                                    count_ill=0,
-                                    proc_ill=0,
-                                    closed=False,
-                                    date_open=None,
-                                    date_closed=None,
-                                    date=date.today()))
+        mark_datasend_dirty(session)
+        await ClassCRUD.upsert(session=session,
+                               values=ClassDataPydanticAdd(
+                                   name_class=name_class,
+                                   man_class=man_class,
+                                   count_class=count_class,
+                                   count_ill=0,
+                                   proc_ill=0,
+                                   closed=False,
+                                   date_open=None,
+                                   date_closed=None,
+                                   date=date.today()),
+                               conflict_keys=['name_class'], update_fields=['man_class', 'count_class'])
     except Exception as e:
         logger.error(e)
     redirect_url = request.url_for('admin_monitoring').include_query_params(msg="Successfully created!")
@@ -137,6 +120,7 @@ async def del_class(request: Request, data: Annotated[ClassPydanticOne, Form()],
                     user_data: User = Depends(get_current_user), session: AsyncSession = SessionDep):
     name_class = data.name_class
     try:
+        mark_datasend_dirty(session)
         await ClassCRUD.delete(session=session, filters=ClassPydanticOne(name_class=name_class))
     except Exception as e:
         logger.error(e)
@@ -152,6 +136,7 @@ async def del_class(request: Request, data: Annotated[ClassDataPyndantiClosed, F
     date_closed = data.date_closed
     date_open = data.date_open
     try:
+        mark_datasend_dirty(session)
         await ClassCRUD.update(session=session, filters=ClassPydanticOne(name_class=name_class),
                                values=ClassDataPydanticOpen(closed=closed, date_closed=date_closed,
                                                             date_open=date_open))
@@ -170,10 +155,9 @@ async def del_class(request: Request, data: Annotated[ClassesDataPydanticClosed,
     date_closed = data.date_closed
     date_open = data.date_open
     try:
-        all_classes = await ClassCRUD.get_all(session=session)
-        if all_classes and closed:
-            for cls in all_classes:
-                await ClassCRUD.update(session=session, filters=ClassPydanticOne(name_class=cls.name_class),
+        mark_datasend_dirty(session)
+        if closed:
+            await ClassCRUD.update_all(session=session,
                                        values=ClassDataPydanticOpen(closed=closed, date_closed=date_closed,
                                                                     date_open=date_open))
 
@@ -189,55 +173,16 @@ async def del_class(request: Request, data: Annotated[ClassesDataPydanticClosed,
 async def send_data_class(request: Request, data: Annotated[ClassDataPydanticSend, Form()],
                           session: AsyncSession = SessionDep):
     name_class = data.name_class
-    count_ill = data.count_ill
-    date_send = date.today()
-    count_day = data.count_day
-    closed = data.closed
 
     try:
-        current_class = await ClassCRUD.get_class_by_one(session=session, name_class=name_class)
-        proc_ill = 0 if count_ill == 0 else round(count_ill * 100 / current_class.count_class)
-        if current_class:
-            if current_class.closed and closed:
-                await ClassCRUD.update(session=session, filters=ClassPydanticOne(name_class=name_class),
-                                       values=ClassDataPydantic(
-                                           count_ill=count_ill,
-                                           proc_ill=proc_ill,
-                                           closed=closed,
-                                           date=date_send,
-                                           date_open=current_class.date_open,
-                                           date_closed=current_class.date_closed
-                                       ))
-            elif current_class.closed and not closed:
-                await ClassCRUD.update(session=session, filters=ClassPydanticOne(name_class=name_class),
-                                       values=ClassDataPydantic(
-                                           count_ill=count_ill,
-                                           proc_ill=proc_ill,
-                                           closed=False,
-                                           date=date_send,
-                                           date_open=None,
-                                           date_closed=None
-                                       ))
-            elif closed and proc_ill > 20:
-                await ClassCRUD.update(session=session, filters=ClassPydanticOne(name_class=name_class),
-                                       values=ClassDataPydantic(
-                                           count_ill=count_ill,
-                                           proc_ill=proc_ill,
-                                           closed=True,
-                                           date=date_send,
-                                           date_open=date_send + timedelta(days=count_day),
-                                           date_closed=date_send + timedelta(days=1)
-                                       ))
-            else:
+        if send_queue.enabled:
+            await send_queue.submit(data)
+        else:
+            mark_datasend_dirty(session)
+            current_class = await ClassCRUD.get_class_by_one(session=session, name_class=name_class)
+            if current_class:
                 await ClassCRUD.update(session=session, filters=ClassPydanticOne(name_class=name_class),
-                                       values=ClassDataPydantic(
-                                           count_ill=count_ill,
-                                           proc_ill=proc_ill,
-                                           closed=False,
-                                           date=date_send,
-                                           date_open=None,
-                                           date_closed=None
-                                       ))
+                                       values=get_class_send_values(current_class, data, date.today()))
 
     except Exception as e:
         logger.error(e)
@@ -246,29 +191,19 @@ async def send_data_class(request: Request, data: Annotated[ClassDataPydanticSen
 
 
 @router.get('/admin', response_class=HTMLResponse)
-async def admin_monitoring(request: Request, user_data: User = Depends(get_current_user),
-                           session: AsyncSession = SessionDep):
+async def admin_monitoring(request: Request, user_data: User = Depends(get_current_user_read),
+                           session: AsyncSession = ReadSessionDep):
     title = 'Панель управления классами'
 
     classes_list: dict = {}
 
     try:
-        all_classes = await ClassCRUD.get_all(session=session)
+        all_classes = await ClassCRUD.get_class_rows(session=session)
         if all_classes:
             for count_id, _class in enumerate(all_classes, start=1):
                 if _class.name_class not in classes_list:
                     classes_list[_class.name_class] = []
-                classes_list[_class.name_class].append({
-                    'id': count_id,
-                    'man_class': _class.man_class,
-                    'count_ill': _class.count_ill,
-                    'count_class': _class.count_class,
-                    'proc_ill': _class.proc_ill,
-                    'closed': _class.closed,
-                    'date_closed': _class.date_closed,
-                    'date_open': _class.date_open,
-                    'date': _class.date
-                })
+                classes_list[_class.name_class].append({'id': count_id, **_class._asdict()})
     except Exception as e:
         logger.error(e)
 
@@ -278,14 +213,14 @@ async def admin_monitoring(request: Request, user_data: User = Depends(get_curre
 
 
 @router.get('/analysis', response_class=HTMLResponse)
-async def analysis(request: Request, session: AsyncSession = SessionDep):
+async def analysis(request: Request, session: AsyncSession = ReadSessionDep):
     title = 'Анализ заболеваемости'
     json_data: dict = {}
     labels = []
     data = []
     data_class_closed = []
     try:
-        datasend_by_30 = await DataSendCRUD.get_last_by_30(session=session)
+        datasend_by_30 = await DataSendCRUD.get_last_rows_by_30(session=session)
         for datasend in datasend_by_30:
             labels.append(datasend.date_send.strftime("%d.%m.%Y"))
             data.append(datasend.count_all_ill)
@@ -4,60 +4,74 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from venv import logger
 
-from datetime import date, timedelta
+from datetime import date
 
 import aiosmtplib
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 import app.config as config
-from app.schemas.datasend import DataSendPydanticDay, DataSendPydanticUpdate, DataSendPydanticAdd, \
+from app.schemas.datasend import DataSendPydanticDay, DataSendPydanticAdd, \
     DataSendPydanticAddSending
 from app.crud.crud import DataSendCRUD
 from app.crud.crud import ClassCRUD
 from app.db import session_manager
-from app.schemas.classes import ClassPydanticOne, ClassDataPydanticOpen
+
+
+# Дни, итоги которых нужно пересчитать, и день последнего полного пересчета
+_dirty_days: set[date] = set()
+_synced_day: date | None = None
+
+
+def mark_datasend_dirty(session: AsyncSession) -> None:
+    """
+    Помечает итоги текущего дня как устаревшие после коммита сессии
+    :param session: сессия, в которой изменяются данные классов
+    """
+    session.info['datasend_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session: Session) -> None:
+    if session.info.pop('datasend_dirty', False):
+        _dirty_days.add(date.today())
+
+
+@event.listens_for(Session, 'after_rollback')
+def _on_rollback(session: Session) -> None:
+    session.info.pop('datasend_dirty', None)
 
 
 @session_manager.connection()
 async def add_datasend(session: AsyncSession):
+    global _synced_day
     current_date = date.today()
-    tomorrow_date = current_date + timedelta(1)
-
-    count_all_ill = 0
-    count_all = 0
-    count_class_closed = 0
-    count_ill_closed = 0
-    count_all_closed = 0
+    if _synced_day == current_date and current_date not in _dirty_days:
+        return
+    _dirty_days.discard(current_date)
 
     try:
-        all_classes = await ClassCRUD.get_all(session=session)
-        if all_classes:
-            for _ in all_classes:
-                count_all_ill += _.count_ill
-                count_all += _.count_class
-                if _.closed and (_.date_closed < tomorrow_date or _.date_closed is None):
-                    count_class_closed += 1
-                    count_ill_closed += _.count_ill
-                    count_all_closed += _.count_class
+        totals = await ClassCRUD.get_school_totals(session=session, day=current_date)
+        count_all_ill = totals.count_all_ill
+        count_all = totals.count_all
+        count_class_closed = totals.count_class_closed
+        count_ill_closed = totals.count_ill_closed
+        count_all_closed = totals.count_all_closed
 
-        data_send_day = await DataSendCRUD.get_datasend_by_one_day(session=session, day=current_date)
-        if data_send_day:
-            await DataSendCRUD.update(session=session, filters=DataSendPydanticDay(date_send=current_date),
-                                      values=DataSendPydanticUpdate(count_all_ill=count_all_ill, count_all=count_all,
-                                                                    count_class_closed=count_class_closed,
-                                                                    count_ill_closed=count_ill_closed,
-                                                                    count_all_closed=count_all_closed))
-        else:
-            await DataSendCRUD.add(session=session, values=DataSendPydanticAdd(
-                date_send=current_date,
-                count_all_ill=count_all_ill,
-                count_all=count_all,
-                count_class_closed=count_class_closed,
-                count_ill_closed=count_ill_closed,
-                count_all_closed=count_all_closed,
-                sending=False
-            ))
+        await DataSendCRUD.upsert(session=session, values=DataSendPydanticAdd(
+            date_send=current_date,
+            count_all_ill=count_all_ill,
+            count_all=count_all,
+            count_class_closed=count_class_closed,
+            count_ill_closed=count_ill_closed,
+            count_all_closed=count_all_closed,
+            sending=False
+        ), conflict_keys=['date_send'], update_fields=['count_all_ill', 'count_all', 'count_class_closed',
+                                                       'count_ill_closed', 'count_all_closed'])
+        _synced_day = current_date
     except Exception as e:
+        _dirty_days.add(current_date)
         logger.error(e)
 
 
@@ -104,13 +118,6 @@ async def send_datasend(session: AsyncSession):
 async def update_class(session: AsyncSession):
     current_date = date.today()
     try:
-        all_classes = await ClassCRUD.get_all(session=session)
-        if all_classes:
-            for cur_class in all_classes:
-                if cur_class.date_open == current_date:
-                    await ClassCRUD.update(session=session, filters=ClassPydanticOne(name_class=cur_class.name_class),
-                                           values=ClassDataPydanticOpen(closed=False,
-                                                                        date_closed=None,
-                                                                        date_open=None))
+        await ClassCRUD.open_classes_by_date(session=session, day=current_date)
     except Exception as e:
         logger.error(e)
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import date, timedelta
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import app.config as config
+from app.crud.crud import MenuCRUD
+from app.db import session_manager
+from app.export.cache import export_cache
+from app.export.monitoring import ExportDish
+
+# Фоновое формирование после изменения меню и признак, что за время него меню снова менялось
+_task: asyncio.Task | None = None
+_rerun = False
+
+
+def mark_exports_dirty(session: AsyncSession) -> None:
+    """
+    Запускает формирование файлов выгрузки на ближайшие дни после коммита сессии
+    :param session: сессия, в которой изменяются меню или блюда
+    """
+    session.info['exports_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session: Session) -> None:
+    if session.info.pop('exports_dirty', False):
+        request_pregeneration()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _on_rollback(session: Session) -> None:
+    session.info.pop('exports_dirty', None)
+
+
+def request_pregeneration() -> None:
+    """Запускает pregenerate_exports в фоне; если он уже идет - повторяет его после завершения"""
+    global _task, _rerun
+    if config.EXPORT_PREGENERATE_DAYS <= 0 or config.EXPORT_CACHE_SIZE <= 0:
+        return
+    if _task is not None and not _task.done():
+        _rerun = True
+        return
+    try:
+        _task = asyncio.get_running_loop().create_task(_pregenerate_loop())
+    except RuntimeError:
+        _task = None
+
+
+async def _pregenerate_loop() -> None:
+    global _rerun
+    while True:
+        _rerun = False
+        await pregenerate_exports()
+        if not _rerun:
+            return
+
+
+async def pregenerate_exports() -> None:
+    """
+    Формирует файлы выгрузки мониторинга на EXPORT_PREGENERATE_DAYS дней вперед.
+    Дни, меню которых не изменилось, берутся из кэша, файлы удаленных меню вытесняются
+    """
+    if config.EXPORT_PREGENERATE_DAYS <= 0 or config.EXPORT_CACHE_SIZE <= 0:
+        return
+    date_from = date.today()
+    date_to = date_from + timedelta(days=config.EXPORT_PREGENERATE_DAYS - 1)
+    try:
+        # Чтение из основной БД: формирование идет сразу после коммита, и реплика может еще не получить изменения
+        async with session_manager.session_maker() as session:
+            menus_db = await MenuCRUD.get_category_menus_with_dish_by_range(session=session, date_from=date_from,
+                                                                            date_to=date_to)
+        dishes_by_day: dict[date, list[ExportDish]] = {}
+        for menu in menus_db:
+            dishes_by_day.setdefault(menu.date_menu, []).append(ExportDish.from_menu(menu))
+
+        day = date_from
+        while day <= date_to:
+            if day not in dishes_by_day:
+                export_cache.discard(day)
+            day += timedelta(days=1)
+        await asyncio.gather(*(export_cache.get_or_build(day, dishes) for day, dishes in dishes_by_day.items()))
+        logger.info(f"Файлы выгрузки сформированы на {len(dishes_by_day)} дн.: {export_cache.stats()}")
+    except Exception as e:
+        logger.error(f"Ошибка формирования файлов выгрузки: {e}")
+
+
+async def stop_pregeneration() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -0,0 +1,160 @@
+import asyncio
+from datetime import date, timedelta
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.config as config
+from app.crud.crud import ClassCRUD
+from app.crud.read_models import ClassRow
+from app.db import session_manager
+from app.models.models import Class
+from app.scheduler.datasend import mark_datasend_dirty
+from app.schemas.classes import ClassDataPydanticSend, ClassDataPydantic
+
+
+def get_class_send_values(current_class: Class | ClassRow, data: ClassDataPydanticSend,
+                          date_send: date) -> ClassDataPydantic:
+    """
+    Рассчитывает новые данные класса по отправленным классным руководителем сведениям
+    :param current_class: текущие данные класса (запись или строка из кэша)
+    :param data: данные формы отправки
+    :param date_send: дата отправки
+    :return:
+    """
+    count_ill = data.count_ill
+    closed = data.closed
+    proc_ill = 0 if count_ill == 0 else round(count_ill * 100 / current_class.count_class)
+    if current_class.closed and closed:
+        return ClassDataPydantic(count_ill=count_ill, proc_ill=proc_ill, closed=closed, date=date_send,
+                                 date_open=current_class.date_open, date_closed=current_class.date_closed)
+    if closed and proc_ill > 20:
+        return ClassDataPydantic(count_ill=count_ill, proc_ill=proc_ill, closed=True, date=date_send,
+                                 date_open=date_send + timedelta(days=data.count_day),
+                                 date_closed=date_send + timedelta(days=1))
+    return ClassDataPydantic(count_ill=count_ill, proc_ill=proc_ill, closed=False, date=date_send,
+                             date_open=None, date_closed=None)
+
+
+class SendDataQueue:
+    """
+    Очередь отправки данных классов: накапливает отправки и применяет их
+    пачкой одним UPDATE раз в interval_ms миллисекунд.
+    """
+
+    def __init__(self, interval_ms: int):
+        self.interval = interval_ms / 1000
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._worker is not None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Очередь отправки данных классов запущена, интервал {self.interval} с")
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError('Очередь отправки данных остановлена'))
+        logger.info("Очередь отправки данных классов остановлена")
+
+    async def submit(self, data: ClassDataPydanticSend) -> None:
+        """
+        Ставит данные класса в очередь и ждет коммита пачки, в которую они попали
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((data, future))
+        await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                await asyncio.sleep(self.interval)
+                while not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                await self._apply(batch)
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError('Очередь отправки данных остановлена'))
+                raise
+
+    async def _apply(self, batch: list[tuple[ClassDataPydanticSend, asyncio.Future]]) -> None:
+        date_send = date.today()
+        # Последняя отправка по классу перекрывает предыдущие в той же пачке
+        last_by_class = {data.name_class: data for data, _ in batch}
+        # Ошибки отдельных классов: они получают только свои отправки, остальная пачка применяется
+        errors: dict[str, Exception] = {}
+        try:
+            async with session_manager.session_maker() as session:
+                classes = await ClassCRUD.get_classes_by_names(session=session, names=list(last_by_class))
+                classes_by_name = {_class.name_class: _class for _class in classes}
+                for name in set(last_by_class) - set(classes_by_name):
+                    errors[name] = ValueError(f"Класс {name} не найден")
+                values_by_class = {}
+                for name, _class in classes_by_name.items():
+                    try:
+                        values = get_class_send_values(_class, last_by_class[name], date_send)
+                        values_by_class[name] = {'id': _class.id, **values.model_dump()}
+                    except Exception as e:
+                        logger.error(f"Ошибка расчета данных класса {name}: {e}")
+                        errors[name] = e
+                try:
+                    mark_datasend_dirty(session)
+                    await ClassCRUD.update_many(session=session, values=list(values_by_class.values()))
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    logger.error(f"Ошибка при применении пачки отправок классов, применяются по одной: {e}")
+                    await self._apply_one_by_one(session, values_by_class, errors)
+        except Exception as e:
+            logger.error(f"Ошибка при применении пачки отправок классов: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logger.info(f"Применено отправок классов: {len(batch)}, классов обновлено: {len(last_by_class) - len(errors)}")
+        for data, future in batch:
+            if future.done():
+                continue
+            if data.name_class in errors:
+                future.set_exception(errors[data.name_class])
+            else:
+                future.set_result(None)
+
+    @staticmethod
+    async def _apply_one_by_one(session: AsyncSession, values_by_class: dict[str, dict],
+                                errors: dict[str, Exception]) -> None:
+        """
+        Применяет данные классов по одному, каждый в своей транзакции,
+        чтобы ошибка одного класса не отменяла отправки остальных
+        """
+        for name, values in values_by_class.items():
+            try:
+                mark_datasend_dirty(session)
+                await ClassCRUD.update_many(session=session, values=[values])
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Ошибка при применении отправки класса {name}: {e}")
+                errors[name] = e
+
+
+send_queue = SendDataQueue(interval_ms=config.SEND_DATA_BATCH_MS)
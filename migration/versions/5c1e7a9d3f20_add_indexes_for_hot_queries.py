@@ -0,0 +1,40 @@
+"""Add indexes for hot queries
+
+Revision ID: 5c1e7a9d3f20
+Revises: 20f487a12444
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7a9d3f20'
+down_revision: Union[str, None] = '20f487a12444'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Имя индекса, таблица, колонки
+INDEXES = [
+    ('ix_menus_date_menu_category_menu', 'menus', ['date_menu', 'category_menu']),
+    ('ix_menus_dish_id', 'menus', ['dish_id']),
+    ('ix_dishes_title', 'dishes', ['title']),
+    ('ix_datasends_created_at', 'datasends', ['created_at']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY не блокирует запись, но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,48 @@
+"""Add unique constraint on dishes.title
+
+Revision ID: 8b4d2f6e1a73
+Revises: 5c1e7a9d3f20
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4d2f6e1a73'
+down_revision: Union[str, None] = '5c1e7a9d3f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Блюда с одинаковым названием обновлялись вместе, поэтому оставляется первое,
+    # а меню с дублями переводятся на него
+    op.execute("""
+        UPDATE menus SET dish_id = d.keep_id
+        FROM (SELECT id, min(id) OVER (PARTITION BY title) AS keep_id FROM dishes) AS d
+        WHERE menus.dish_id = d.id AND d.id <> d.keep_id
+    """)
+    op.execute("""
+        DELETE FROM dishes
+        USING (SELECT id, min(id) OVER (PARTITION BY title) AS keep_id FROM dishes) AS d
+        WHERE dishes.id = d.id AND d.id <> d.keep_id
+    """)
+    # Уникальный индекс строится без блокировки записи, затем становится ограничением
+    with op.get_context().autocommit_block():
+        op.create_index('dishes_title_key', 'dishes', ['title'], unique=True, if_not_exists=True,
+                        postgresql_concurrently=True)
+    op.execute('ALTER TABLE dishes ADD CONSTRAINT dishes_title_key UNIQUE USING INDEX dishes_title_key')
+    # Обычный индекс по названию больше не нужен
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_dishes_title', table_name='dishes', if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_dishes_title', 'dishes', ['title'], unique=False, if_not_exists=True,
+                        postgresql_concurrently=True)
+    op.drop_constraint('dishes_title_key', 'dishes', type_='unique')